@@ -0,0 +1,257 @@
+# benchmarks/load_test.py - Simulated slash-command traffic against the real command callbacks
+# Run from the repository root with `python benchmarks/load_test.py`. Commands
+# registered by commands.register_commands are called with fake interactions
+# arriving at --rate per second, against a synthetic database and a stubbed
+# Chess.com API; nothing connects to Discord or Chess.com. Reports throughput,
+# acknowledgement and completion latency percentiles and event-loop lag.
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from discord import app_commands
+import chess_api
+from commands import register_commands
+from run import generate_database, synthetic_stats
+
+# Discord drops interactions that are not acknowledged within this many seconds
+ACK_DEADLINE = 3.0
+
+class FakeResponse:
+	"""Stands in for requests.Response in the stubbed Chess.com API"""
+
+	def __init__(self, payload):
+		self.payload = payload
+		self.status_code = 200
+
+	def raise_for_status(self):
+		pass
+
+	def json(self):
+		return self.payload
+
+def stub_chess_api(latency, seed):
+	"""Answer Chess.com requests with random stats after latency seconds, from a worker thread"""
+	rng = random.Random(seed)
+	def get(url, headers=None, timeout=None):
+		time.sleep(latency)
+		return FakeResponse(synthetic_stats(rng))
+	chess_api.requests.get = get
+
+class FakeUser:
+	def __init__(self, user_id):
+		self.id = user_id
+		self.name = self.display_name = f"user{user_id}"
+		self.mention = f"<@{user_id}>"
+		self.color = None
+		self.display_avatar = types.SimpleNamespace(url="https://cdn.discordapp.com/embed/avatars/0.png")
+
+	def __eq__(self, other):
+		return getattr(other, "id", None) == self.id
+
+	def __hash__(self):
+		return hash(self.id)
+
+class FakeMessage:
+	def __init__(self, latency):
+		self.latency = latency
+
+	async def edit(self, **kwargs):
+		await asyncio.sleep(self.latency)
+		return self
+
+class FakeFollowup:
+	def __init__(self, latency):
+		self.latency = latency
+
+	async def send(self, *args, **kwargs):
+		await asyncio.sleep(self.latency)
+		return FakeMessage(self.latency)
+
+class FakeInteractionResponse:
+	def __init__(self, interaction, latency):
+		self.interaction = interaction
+		self.latency = latency
+		self._done = False
+
+	def is_done(self):
+		return self._done
+
+	async def _acknowledge(self):
+		self.interaction.acknowledged_at = time.perf_counter()
+		self._done = True
+		await asyncio.sleep(self.latency)
+
+	async def defer(self, **kwargs):
+		await self._acknowledge()
+
+	async def send_message(self, *args, **kwargs):
+		await self._acknowledge()
+
+	async def edit_message(self, **kwargs):
+		await self._acknowledge()
+
+class FakeInteraction:
+	"""The parts of discord.Interaction the command callbacks use"""
+
+	_ids = itertools.count(1)
+
+	def __init__(self, command, user_id, guild_id, latency):
+		self.id = next(self._ids)
+		self.command = command
+		self.user = FakeUser(user_id)
+		self.guild = None
+		self.guild_id = guild_id
+		self.response = FakeInteractionResponse(self, latency)
+		self.followup = FakeFollowup(latency)
+		self.created_at = time.perf_counter()
+		self.acknowledged_at = None
+		self._message = FakeMessage(latency)
+
+	async def original_response(self):
+		return self._message
+
+def build_commands():
+	"""Register the commands on a client that never logs in and return them by name"""
+	client = discord.Client(intents=discord.Intents.none())
+	client.tree = app_commands.CommandTree(client)
+	register_commands(client)
+	return {command.name: command for command in client.tree.get_commands()}
+
+def command_arguments(name, rng):
+	if name == "leaderboard":
+		category = rng.choice(["rapid", "blitz", "bullet", "puzzle", "puzzle_rush", "overall"])
+		return {"category": app_commands.Choice(name=category, value=category), "around_me": rng.random() < 0.3}
+	return {}
+
+async def monitor_loop_lag(interval, samples, stop):
+	"""Record how late the loop wakes up from a sleep of interval seconds"""
+	while not stop.is_set():
+		start = time.perf_counter()
+		await asyncio.sleep(interval)
+		samples.append(time.perf_counter() - start - interval)
+
+def percentiles(values):
+	if not values:
+		return None
+	values = sorted(values)
+	def pick(fraction):
+		return values[min(int(fraction * len(values)), len(values) - 1)]
+	return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+async def simulate(args, players):
+	commands = build_commands()
+	mix = [(name, weight) for name, weight in args.mix]
+	names = [name for name, _ in mix]
+	weights = [weight for _, weight in mix]
+	rng = random.Random(args.seed)
+
+	records = []
+	errors = {}
+	async def handle(name, interaction):
+		try:
+			await commands[name].callback(interaction, **command_arguments(name, rng))
+		except Exception as e:
+			errors[name] = errors.get(name, 0) + 1
+			if errors[name] == 1:
+				print(f"/{name} failed: {e!r}", file=sys.stderr)
+			return
+		records.append((name, interaction.created_at, interaction.acknowledged_at, time.perf_counter()))
+
+	lag = []
+	stop = asyncio.Event()
+	monitor = asyncio.create_task(monitor_loop_lag(args.lag_interval, lag, stop))
+	tasks = []
+	start = time.perf_counter()
+	while time.perf_counter() - start < args.duration:
+		# Poisson arrivals at the configured rate
+		await asyncio.sleep(rng.expovariate(args.rate))
+		name = rng.choices(names, weights)[0]
+		interaction = FakeInteraction(commands[name], 10 ** 17 + rng.randrange(players),
+									rng.randrange(args.guilds), args.discord_latency)
+		tasks.append(asyncio.create_task(handle(name, interaction)))
+	await asyncio.gather(*tasks)
+	elapsed = time.perf_counter() - start
+	stop.set()
+	await monitor
+
+	report = {"sent": len(tasks), "completed": len(records), "errors": errors,
+			"elapsed": elapsed, "throughput": len(records) / elapsed,
+			"loop_lag": percentiles(lag), "commands": {}}
+	for name in names:
+		rows = [record for record in records if record[0] == name]
+		acks = [acknowledged - created for _, created, acknowledged, _ in rows if acknowledged is not None]
+		report["commands"][name] = {
+			"completed": len(rows),
+			"ack": percentiles(acks),
+			"missed_deadline": sum(1 for ack in acks if ack > ACK_DEADLINE),
+			"total": percentiles([finished - created for _, created, _, finished in rows]),
+		}
+	return report
+
+def print_report(report):
+	def milliseconds(stats, key):
+		return f"{stats[key] * 1000:8.1f}" if stats else "       -"
+	print(f"Sent {report['sent']}, completed {report['completed']} in {report['elapsed']:.1f}s "
+		f"({report['throughput']:.1f}/s), errors: {report['errors'] or 'none'}")
+	print(f"{'command':<12} {'count':>6} {'ack p50':>8} {'ack p95':>8} {'ack p99':>8} "
+		f"{'done p50':>8} {'done p95':>8} {'done p99':>8} {'missed':>6}  (ms)")
+	for name, stats in report["commands"].items():
+		print(f"{name:<12} {stats['completed']:>6} "
+			f"{milliseconds(stats['ack'], 'p50')} {milliseconds(stats['ack'], 'p95')} {milliseconds(stats['ack'], 'p99')} "
+			f"{milliseconds(stats['total'], 'p50')} {milliseconds(stats['total'], 'p95')} "
+			f"{milliseconds(stats['total'], 'p99')} {stats['missed_deadline']:>6}")
+	lag = report["loop_lag"]
+	print(f"Event loop lag (ms): p50 {milliseconds(lag, 'p50')}  p99 {milliseconds(lag, 'p99')}  "
+		f"max {milliseconds(lag, 'max')}")
+
+def parse_mix(value):
+	"""Parse "leaderboard=6,profile=3,refresh=1" into (name, weight) pairs"""
+	mix = []
+	for item in value.split(","):
+		name, weight = item.split("=")
+		mix.append((name.strip(), float(weight)))
+	return mix
+
+def main():
+	parser = argparse.ArgumentParser(description="Load-test the slash command callbacks offline")
+	parser.add_argument("--players", type=int, default=10000, help="Players in the synthetic database")
+	parser.add_argument("--history", type=int, default=3, help="Rating rows per player")
+	parser.add_argument("--rate", type=float, default=50, help="Interactions per second")
+	parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic")
+	parser.add_argument("--mix", type=parse_mix, default=parse_mix("leaderboard=6,profile=3,refresh=1"),
+					 	help="Relative weights of the commands")
+	parser.add_argument("--guilds", type=int, default=50, help="Guilds the interactions are spread over")
+	parser.add_argument("--discord-latency", type=float, default=0.05,
+					 	help="Seconds each simulated Discord API call takes")
+	parser.add_argument("--api-latency", type=float, default=0.3,
+					 	help="Seconds each stubbed Chess.com request takes")
+	parser.add_argument("--lag-interval", type=float, default=0.05,
+					 	help="Sleep used to measure event-loop lag, in seconds")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--output", help="Also write the report to this JSON file")
+	args = parser.parse_args()
+
+	stub_chess_api(args.api_latency, args.seed)
+	with tempfile.TemporaryDirectory(prefix="chess-load-") as directory:
+		generate_database(os.path.join(directory, "load.db"), args.players, args.history, args.seed)
+		report = asyncio.run(simulate(args, args.players))
+
+	print_report(report)
+	if args.output:
+		with open(args.output, "w") as file:
+			json.dump(report, file, indent=2)
+	missed = sum(stats["missed_deadline"] for stats in report["commands"].values())
+	return 1 if missed or report["errors"] else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,230 @@
+# benchmarks/run.py - Benchmarks of the database, ranking and leaderboard paths on synthetic data
+# Run from the repository root with `python benchmarks/run.py`. Each size gets
+# a fresh synthetic database in a temporary directory. Results are written as
+# JSON and compared against the committed benchmarks/baseline.json (or the
+# file given with --baseline); the exit code is 1 if any benchmark got slower
+# than the threshold allows. Refresh the baseline with --save-baseline after
+# intended performance changes, on the machine the comparisons run on.
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import (setup_database, get_leaderboard_data, iter_leaderboard, get_user_profile,
+					store_user_ratings, register_users_bulk, get_all_users, get_data_version)
+from ranking import engine, CATEGORIES
+from leaderboard import LeaderboardCursor, get_page
+from refresh import refresh_users
+from providers import ChessComProvider, primary_provider
+
+# Share of ratings left empty, like players who never played a time control
+MISSING_RATIO = 0.1
+# Players touched by the write benchmarks
+WRITE_BATCH = 100
+# Reference results compared against by default
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def synthetic_stats(rng):
+	"""A Chess.com stats response with random ratings"""
+	def rating(low, high):
+		return None if rng.random() < MISSING_RATIO else rng.randint(low, high)
+	stats = {}
+	for key in ("chess_rapid", "chess_blitz", "chess_bullet"):
+		value = rating(400, 2800)
+		if value is not None:
+			stats[key] = {"last": {"rating": value}}
+	puzzle = rating(400, 3200)
+	if puzzle is not None:
+		stats["tactics"] = {"highest": {"rating": puzzle}}
+	puzzle_rush = rating(5, 60)
+	if puzzle_rush is not None:
+		stats["puzzle_rush"] = {"best": {"score": puzzle_rush}}
+	return stats
+
+def generate_database(path, players, history, seed):
+	"""Create a database of players, each with history rows of ratings"""
+	database.DB_PATH = path
+	setup_database()
+	rng = random.Random(seed)
+	start = datetime.datetime(2024, 1, 1)
+	conn = sqlite3.connect(path)
+	conn.executemany("INSERT INTO users (discord_id, chess_username, join_date) VALUES (?, ?, ?)",
+					((10 ** 17 + i, f"player{i}", start.isoformat()) for i in range(players)))
+	def ratings():
+		for i in range(players):
+			for step in range(history):
+				values = primary_provider.parse(synthetic_stats(rng))
+				updated = start + datetime.timedelta(days=step, seconds=i)
+				yield (10 ** 17 + i, *values, updated.isoformat())
+	conn.executemany('''
+	INSERT INTO ratings (discord_id, rapid_rating, blitz_rating, bullet_rating,
+						puzzle_rating, puzzle_rush_score, last_updated)
+	VALUES (?, ?, ?, ?, ?, ?, ?)
+	''', ratings())
+	conn.commit()
+	conn.close()
+	# Force the engine to load the new database
+	engine.version = None
+
+def measure(function, repeat):
+	samples = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		samples.append(time.perf_counter() - start)
+	return {"median": statistics.median(samples), "min": min(samples), "runs": repeat}
+
+def calibrate(repeat=7):
+	"""Fastest time of a fixed workload, a measure of the machine's speed
+
+	Mixes Python sorting with an in-memory SQLite sort, like the benchmarks.
+	"""
+	rng = random.Random(0)
+	values = [rng.random() for _ in range(200000)]
+	def workload():
+		sorted(values)
+		conn = sqlite3.connect(":memory:")
+		conn.execute("CREATE TABLE t (x REAL)")
+		conn.executemany("INSERT INTO t VALUES (?)", ((value,) for value in values[:50000]))
+		conn.execute("SELECT x FROM t ORDER BY x DESC").fetchall()
+		conn.close()
+	return measure(workload, repeat)["min"]
+
+def benchmarks(players, refresh_players, seed):
+	"""(name, function) pairs for one database size, reads before writes"""
+	rng = random.Random(seed)
+	loop = asyncio.new_event_loop()
+	ids = [10 ** 17 + rng.randrange(players) for _ in range(WRITE_BATCH)]
+	middle_page = max(players // 2 // 25, 1)
+
+	def render_page():
+		cursor = LeaderboardCursor("overall")
+		cursor.go_to(middle_page)
+		loop.run_until_complete(get_page(cursor))
+
+	class StubProvider(ChessComProvider):
+		async def fetch(self, username):
+			return synthetic_stats(rng)
+
+	for category in CATEGORIES:
+		yield f"leaderboard_data/{category}", lambda category=category: get_leaderboard_data(category)
+	for category in CATEGORIES:
+		yield f"export_scan/{category}", lambda category=category: sum(1 for _ in iter_leaderboard(category))
+	yield "ranking_rebuild", lambda: engine.rebuild(get_data_version())
+	for category in CATEGORIES:
+		yield f"ranking_page/{category}", lambda category=category: engine.page(category, middle_page)
+	yield "profile_lookup", lambda: [get_user_profile(discord_id) for discord_id in ids]
+	yield "render_page", render_page
+	yield "store_ratings", lambda: [store_user_ratings(discord_id, primary_provider.parse(synthetic_stats(rng))) for discord_id in ids]
+	yield "bulk_register", lambda: register_users_bulk(
+		[(discord_id, f"player{discord_id - 10 ** 17}", primary_provider.parse(synthetic_stats(rng)))
+		 for discord_id in ids])
+	users = get_all_users()[:refresh_players]
+	yield f"refresh_cycle/{len(users)}", lambda: loop.run_until_complete(refresh_users(users, 0, StubProvider()))
+
+def run(args):
+	results = {}
+	with tempfile.TemporaryDirectory(prefix="chess-bench-") as directory:
+		for players in args.sizes:
+			path = os.path.join(directory, f"bench-{players}.db")
+			start = time.perf_counter()
+			generate_database(path, players, args.history, args.seed)
+			print(f"Generated {players} players x {args.history} rows in {time.perf_counter() - start:.1f}s",
+				file=sys.stderr)
+			for name, function in benchmarks(players, args.refresh_players, args.seed):
+				key = f"{players}/{name}"
+				results[key] = measure(function, args.repeat)
+				print(f"{key:<40} {results[key]['median'] * 1000:10.2f}ms", file=sys.stderr)
+	return results
+
+def compare(results, baseline, threshold, min_delta, scale=1.0):
+	"""Print the change against the baseline and return the keys that regressed
+
+	The fastest run of each benchmark is compared, being the least affected
+	by other load on the machine, after multiplying the baseline by scale,
+	the speed of this machine relative to the baseline's. Slowdowns under
+	min_delta seconds are ignored, sub-millisecond timings being mostly noise.
+	"""
+	regressions = []
+	for key, current in results.items():
+		previous = baseline.get(key)
+		if previous is None:
+			continue
+		expected = previous["min"] * scale
+		ratio = current["min"] / expected if expected else 1.0
+		flag = ""
+		if ratio > 1 + threshold and current["min"] - expected >= min_delta:
+			regressions.append(key)
+			flag = "  REGRESSION"
+		print(f"{key:<40} {expected * 1000:10.2f}ms -> {current['min'] * 1000:10.2f}ms "
+			f"{ratio:6.2f}x{flag}")
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the database and leaderboard paths")
+	parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+					 	default=[1000, 10000, 100000], help="Comma-separated player counts")
+	parser.add_argument("--history", type=int, default=5, help="Rating rows per player")
+	parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark, the median is reported")
+	parser.add_argument("--refresh-players", type=int, default=1000,
+					 	help="Players refreshed by the refresh cycle benchmark")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results")
+	parser.add_argument("--baseline", default=BASELINE_PATH, help="Results file to compare against")
+	parser.add_argument("--no-compare", action="store_true", help="Don't compare against a baseline")
+	parser.add_argument("--save-baseline", action="store_true",
+					 	help="Also write the results as the new baseline instead of comparing")
+	parser.add_argument("--threshold", type=float, default=0.25,
+					 	help="Allowed slowdown against the baseline, as a fraction")
+	parser.add_argument("--min-delta-ms", type=float, default=1.0,
+					 	help="Smallest slowdown reported as a regression, in milliseconds")
+	args = parser.parse_args()
+
+	calibration = calibrate()
+	results = run(args)
+	report = {
+		"calibration": calibration,
+		"python": platform.python_version(),
+		"sqlite": sqlite3.sqlite_version,
+		"platform": platform.platform(),
+		"history": args.history,
+		"repeat": args.repeat,
+		"seed": args.seed,
+		"results": results,
+	}
+	for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+		with open(path, "w") as file:
+			json.dump(report, file, indent=2)
+			file.write("\n")
+
+	if not (args.no_compare or args.save_baseline):
+		try:
+			with open(args.baseline) as file:
+				baseline = json.load(file)
+		except FileNotFoundError:
+			print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+			return 1
+		if baseline["python"] != report["python"]:
+			print(f"Baseline was recorded on Python {baseline['python']}, timings may not be comparable")
+		# Timings of a baseline recorded on a faster or slower machine are scaled by the calibration ratio
+		scale = calibration / baseline["calibration"]
+		print(f"Machine speed relative to the baseline: {1 / scale:.2f}x")
+		regressions = compare(results, baseline["results"], args.threshold, args.min_delta_ms / 1000, scale)
+		if regressions:
+			print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+			return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -2,24 +2,42 @@
 import discord
 from discord.ext import commands
 import logging
+import config
+import startup
 import token_bot
+from logging_setup import setup_logging
+from stall_watchdog import watchdog
 
 # Configure logging
-logging.basicConfig(
-	level=logging.INFO,
-	format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging()
 
 logger = logging.getLogger('chess_bot')
 
 def setup_bot():
 	"""Initialize and configure the bot"""
 	# Set up intents
-	intents = discord.Intents.all()
+	if config.LEAN_INTENTS:
+		# Only guild and role state plus the members intent needed to request
+		# members by id. Nothing is chunked at startup and only the members
+		# requested by members.resolve_members are cached.
+		intents = discord.Intents.none()
+		intents.guilds = True
+		intents.members = True
+		options = {"member_cache_flags": discord.MemberCacheFlags.none(), "chunk_guilds_at_startup": False}
+	else:
+		intents = discord.Intents.all()
+		options = {}
+	if config.SHARDED:
+		# Processes splitting the shards share the SQLite database; the background
+		# refresh only runs in the one holding the home guild (tasks.owns_home_guild)
+		client_class = discord.AutoShardedClient
+		options.update(shard_count=config.SHARD_COUNT, shard_ids=config.SHARD_IDS)
+	else:
+		client_class = discord.Client
 	GUILD = discord.Object(id=token_bot.MY_GUILD)
-	class MyClient(discord.Client):
-		def __init__(self, *, intents: discord.Intents):
-			super().__init__(intents=intents)
+	class MyClient(client_class):
+		def __init__(self, *, intents: discord.Intents, **options):
+			super().__init__(intents=intents, **options)
 			# A CommandTree is a special type that holds all the application command
 			# state required to make it work. This is a separate class because it
 			# allows all the extra state to be opt-in.
@@ -33,27 +51,35 @@ def setup_bot():
 		# Instead of specifying a guild to every command, we copy over our global commands instead.
 		# By doing so, we don't have to wait up to an hour until they are shown to the end-user.
 		async def setup_hook(self):
+			startup.mark("login")
+			if config.STALL_WATCHDOG:
+				watchdog.start()
 			# This copies the global commands over to your guild.
 			self.tree.copy_global_to(guild=GUILD)
-			await self.tree.sync(guild=GUILD)
+			# setup_hook runs once per process, unlike on_ready which runs again
+			# on every reconnect. Each scope is only synced when its commands changed.
+			try:
+				await startup.sync_command_tree(self.tree, GUILD)
+				await startup.sync_command_tree(self.tree)
+			except Exception as e:
+				logger.error(f"Failed to sync commands: {e}")
+			startup.mark("command_sync")
 
 
 	
 	# Create bot instance
-	bot = MyClient(intents=intents)
+	bot = MyClient(intents=intents, **options)
 
-	# Register event handlers
+	# Register event handlers (on_ready is installed by tasks.register_tasks)
 	@bot.event
-	async def on_ready():
-		logger.info(f'Logged in as {bot.user}')
-		try:
-			synced = await bot.tree.sync()
-			logger.info(f"Synced {len(synced)} command(s)")
-		except Exception as e:
-			logger.error(f"Failed to sync commands: {e}")
+	async def on_interaction(interaction):
+		# Buttons of persistent leaderboards are served here for every message,
+		# including ones posted before the last restart
+		await handle_component(interaction)
 	
 	# Import and add commands
 	from commands import register_commands
+	from leaderboard import handle_component
 	register_commands(bot)
 	
 	return bot
\ No newline at end of file
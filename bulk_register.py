@@ -0,0 +1,85 @@
+# bulk_register.py - Bulk registration from a CSV of discord_id,username pairs
+import asyncio
+import csv
+import logging
+import re
+import config
+from database import register_users_bulk
+from providers import primary_provider
+
+logger = logging.getLogger('chess_bot.bulk_register')
+
+USERNAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{3,25}$')
+DISCORD_ID_PATTERN = re.compile(r'^<?@?!?(\d{15,21})>?$')
+
+def parse_registrations(lines):
+	"""Yield (line_number, discord_id, username, error) for each row of the file
+
+	Rows are validated as they are read; error is None for valid rows.
+	"""
+	seen = set()
+	for line_number, row in enumerate(csv.reader(lines), start=1):
+		fields = [field.strip() for field in row]
+		if not any(fields):
+			continue
+		if len(fields) != 2:
+			yield line_number, None, None, "expected discord_id,username"
+			continue
+		discord_id, username = fields
+		match = DISCORD_ID_PATTERN.match(discord_id)
+		if not match:
+			# Allow a header row
+			if line_number == 1:
+				continue
+			yield line_number, None, username, f"invalid Discord id '{discord_id}'"
+			continue
+		if not USERNAME_PATTERN.match(username):
+			yield line_number, None, username, f"invalid Chess.com username '{username}'"
+			continue
+		discord_id = int(match.group(1))
+		if discord_id in seen:
+			yield line_number, discord_id, username, "duplicate Discord id"
+			continue
+		seen.add(discord_id)
+		yield line_number, discord_id, username, None
+
+async def _import_batch(batch, failures):
+	"""Fetch a batch concurrently (under the shared rate limit) and store it in one transaction"""
+	results = await asyncio.gather(*(primary_provider.fetch(username) for _, _, username in batch))
+	found = []
+	for (line_number, discord_id, username), chess_data in zip(batch, results):
+		if chess_data:
+			found.append((line_number, discord_id, username, chess_data))
+		else:
+			failures.append((line_number, username, "not found on Chess.com"))
+	if not found:
+		return 0
+	try:
+		register_users_bulk([(discord_id, username, primary_provider.parse(chess_data)) for _, discord_id, username, chess_data in found])
+	except Exception as e:
+		logger.error(f"Error storing bulk registrations: {e}")
+		failures.extend((line_number, username, "database error") for line_number, _, username, _ in found)
+		return 0
+	return len(found)
+
+async def import_registrations(lines, on_progress, batch_size=config.BULK_REGISTER_BATCH_SIZE):
+	"""Import the rows of a CSV file, calling on_progress(imported, failed) after each batch
+
+	Returns the number of imported rows and a list of (line_number, username, reason) failures.
+	"""
+	imported = 0
+	failures = []
+	batch = []
+	for line_number, discord_id, username, error in parse_registrations(lines):
+		if error:
+			failures.append((line_number, username, error))
+			continue
+		batch.append((line_number, discord_id, username))
+		if len(batch) >= batch_size:
+			imported += await _import_batch(batch, failures)
+			batch = []
+			await on_progress(imported, len(failures))
+	if batch:
+		imported += await _import_batch(batch, failures)
+	await on_progress(imported, len(failures))
+	return imported, failures
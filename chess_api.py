@@ -2,9 +2,41 @@
 import requests
 import asyncio
 import logging
+import time
+import config
+from tracing import span
 
 logger = logging.getLogger('chess_bot.chess_api')
 
+class RateLimiter:
+	"""Limit concurrent requests and space out their start times"""
+
+	def __init__(self, max_concurrency, min_interval):
+		self.min_interval = min_interval
+		self._semaphore = asyncio.Semaphore(max_concurrency)
+		self._lock = asyncio.Lock()
+		self._next_start = 0
+
+	async def __aenter__(self):
+		await self._semaphore.acquire()
+		async with self._lock:
+			delay = self._next_start - time.monotonic()
+			if delay > 0:
+				await asyncio.sleep(delay)
+			self._next_start = time.monotonic() + self.min_interval
+
+	async def __aexit__(self, *exc_info):
+		self._semaphore.release()
+
+# Shared by every caller so concurrent commands and imports stay under Chess.com's limits
+rate_limiter = RateLimiter(config.CHESS_API_MAX_CONCURRENCY, config.CHESS_API_MIN_INTERVAL)
+
+async def _get(url, headers):
+	"""Run a GET request in a thread so it doesn't block the event loop"""
+	async with rate_limiter:
+		with span("api_fetch"):
+			return await asyncio.to_thread(requests.get, url, headers=headers, timeout=30)
+
 async def fetch_chess_data(username):
 	"""Fetch player data from Chess.com API"""
 	headers = {
@@ -13,11 +45,11 @@ async def fetch_chess_data(username):
 	
 	try:
 		# Verify user exists
-		user_response = requests.get(f'https://api.chess.com/pub/player/{username}', headers=headers)
+		user_response = await _get(f'https://api.chess.com/pub/player/{username}', headers)
 		user_response.raise_for_status()
 
 		# Get player stats
-		stats_response = requests.get(f'https://api.chess.com/pub/player/{username}/stats', headers=headers)
+		stats_response = await _get(f'https://api.chess.com/pub/player/{username}/stats', headers)
 		stats_response.raise_for_status()
 
 		return stats_response.json()
@@ -42,4 +74,4 @@ def calculate_average_rating(ratings):
 	valid_ratings = [r for r in ratings if r is not None]
 	if not valid_ratings:
 		return 0
-	return sum(valid_ratings) / len(valid_ratings)
\ No newline at end of file
+	return sum(valid_ratings) / len(valid_ratings)
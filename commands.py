@@ -1,34 +1,61 @@
 # commands.py - Bot commands
 import discord
 from discord import app_commands
+import asyncio
 import datetime
+import io
 import logging
-from database import (register_user, unregister_user,unregister_user_chess_com, store_user_ratings,
-				 	get_user_profile, get_leaderboard_data)
-from chess_api import fetch_chess_data, calculate_average_rating
+import os
+import config
+from cooldowns import Cooldown
+from bulk_register import import_registrations, DISCORD_ID_PATTERN
+from export import write_export
+from database import (register_user, unregister_user, store_user_ratings, get_user_id,
+				 	get_user_profile, create_team, delete_team, get_team, set_team_members,
+				 	remove_team_member, link_account, unlink_account, get_user_accounts,
+				 	store_provider_ratings)
+from leaderboard import (LeaderboardCursor, TeamLeaderboardCursor, get_page, get_team_page,
+						send_persistent_leaderboard)
+from ranking import engine
+from chess_api import calculate_average_rating
+from providers import PROVIDERS, primary_provider, linked_providers
 from pagination import Pagination
+from tracing import traced, span, stats
+from username_index import usernames
+from stall_watchdog import watchdog
+import profiler
 
 logger = logging.getLogger('chess_bot.commands')
 
 def register_commands(bot):
 	"""Register all commands with the bot"""
 	
+	def is_admin(interaction: discord.Interaction):
+		return interaction.user.id in config.ADMIN_IDS
+
+	async def registered_username_autocomplete(interaction: discord.Interaction, current: str):
+		# Served from the in-memory index, autocomplete fires on every keystroke
+		return [app_commands.Choice(name=name, value=name) for name in usernames.complete(current)]
+
 	@bot.tree.command(name="register", description="Register your Chess.com username")
 	@app_commands.describe(username="Your Chess.com username")
+	@traced
 	async def register(interaction: discord.Interaction, username: str):
-		await interaction.response.defer(ephemeral=True)
+		with span("defer"):
+			await interaction.response.defer(ephemeral=True)
 		 
 		# Check if username exists on Chess.com
-		chess_data = await fetch_chess_data(username)
+		chess_data = await primary_provider.fetch(username)
 		if not chess_data:
 			await interaction.followup.send(f"Could not find Chess.com user '{username}'. Please check the spelling.", ephemeral=True)
 			return
 		 
-		# Register user
-		result = register_user(interaction.user.id, username)
+		# Register user and store ratings
+		with span("db"):
+			result = register_user(interaction.user.id, username)
+			stored = store_user_ratings(interaction.user.id, primary_provider.parse(chess_data))
 		 
-		# Store ratings
-		if store_user_ratings(interaction.user.id, chess_data):
+		if stored:
 			if result == "updated":
 				await interaction.followup.send(f"Updated your Chess.com username to {username}!", ephemeral=True)
 			else:
@@ -38,12 +65,22 @@ def register_commands(bot):
 
 	@bot.tree.command(name="admin_register", description="Register a Chess.com username")
 	@app_commands.describe(username="Your Chess.com username")
+	@app_commands.autocomplete(username=registered_username_autocomplete)
+	@traced
 	async def admin_register(interaction: discord.Interaction, username: str,discord_id: str):
-		await interaction.response.defer(ephemeral=True)
-		if interaction.user.id != "896650341561548801" or interaction.user.id != "1094139004766666763" or interaction.user.id != "436652531582631944":
-			interaction.followup.send(f"Only admins are allowed to execute this command",ephemeral=True)
+		with span("defer"):
+			await interaction.response.defer(ephemeral=True)
+		if not is_admin(interaction):
+			await interaction.followup.send("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		# Accept a plain id or a pasted mention, like the bulk import does
+		match = DISCORD_ID_PATTERN.match(discord_id.strip())
+		if not match:
+			await interaction.followup.send(f"'{discord_id}' is not a Discord user id or mention.", ephemeral=True)
+			return
+		discord_id = int(match.group(1))
 		# Check if username exists on Chess.com
-		chess_data = await fetch_chess_data(username)
+		chess_data = await primary_provider.fetch(username)
 		if not chess_data:
 			await interaction.followup.send(f"Could not find Chess.com user '{username}'. Please check the spelling.", ephemeral=True)
 			return
@@ -52,7 +89,7 @@ def register_commands(bot):
 		result = register_user(discord_id, username)
 		 
 		# Store ratings
-		if store_user_ratings(discord_id, chess_data):
+		if store_user_ratings(discord_id, primary_provider.parse(chess_data)):
 			if result == "updated":
 				await interaction.followup.send(f"Updated Chess.com username to {username}!", ephemeral=True)
 			else:
@@ -61,15 +98,165 @@ def register_commands(bot):
 			await interaction.followup.send("Registration successful but there was an error storing ratings. Please try refreshing later.", ephemeral=True)
 
 	@bot.tree.command(name="admin_unregister", description="Remove yourself from the Chess.com leaderboard")
+	@app_commands.autocomplete(username=registered_username_autocomplete)
+	@traced
 	async def admin_unregister(interaction: discord.Interaction, username: str):
-		if interaction.user.id != "896650341561548801" or interaction.user.id != "1094139004766666763" or interaction.user.id != "436652531582631944":
-			interaction.followup.send(f"Only admins are allowed to execute this command",ephemeral=True)
-		if unregister_user_chess_com(username):
+		if not is_admin(interaction):
+			await interaction.response.send_message("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		# Resolve the username case-insensitively from the index, checking the
+		# database too before telling an admin a player isn't registered
+		discord_id = usernames.lookup(username) or get_user_id(username)
+		if discord_id is not None and unregister_user(discord_id):
 			await interaction.response.send_message("You have been removed from the Chess.com leaderboard.", ephemeral=True)
 		else:
 			await interaction.response.send_message("You are not registered in the leaderboard.", ephemeral=True)
 
+	@bot.tree.command(name="admin_bulk_register", description="Register many Chess.com usernames from a CSV file")
+	@app_commands.describe(file="CSV or text file with one discord_id,username pair per line")
+	@traced
+	async def admin_bulk_register(interaction: discord.Interaction, file: discord.Attachment):
+		with span("defer"):
+			await interaction.response.defer(ephemeral=True)
+		if not is_admin(interaction):
+			await interaction.followup.send("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		# The attachment is downloaded whole, refuse files that are too big before reading them
+		if file.size > config.BULK_REGISTER_MAX_BYTES:
+			await interaction.followup.send(
+				f"`{file.filename}` is {file.size / 1024 / 1024:.1f} MiB, the limit is "
+				f"{config.BULK_REGISTER_MAX_BYTES / 1024 / 1024:.1f} MiB. Split it into smaller files.",
+				ephemeral=True
+			)
+			return
+		 
+		progress = await interaction.followup.send(f"Importing `{file.filename}`...", ephemeral=True, wait=True)
+		 
+		async def on_progress(imported, failed):
+			await progress.edit(content=f"Importing `{file.filename}`... {imported} registered, {failed} failed")
+		 
+		# Rows are parsed and validated lazily while the batches are imported
+		lines = io.TextIOWrapper(io.BytesIO(await file.read()), encoding="utf-8-sig", errors="replace")
+		imported, failures = await import_registrations(lines, on_progress)
+		 
+		report = f"Imported `{file.filename}`: {imported} registered, {len(failures)} failed."
+		if not failures:
+			await progress.edit(content=report)
+			return
+		details = "\n".join(f"Line {line_number}: {username or '-'} ({reason})" for line_number, username, reason in failures)
+		await progress.edit(content=report)
+		await interaction.followup.send(
+			"Failed rows:",
+			file=discord.File(io.BytesIO(details.encode()), filename="bulk_register_failures.txt"),
+			ephemeral=True
+		)
+
+	@bot.tree.command(name="admin_team_create", description="Create a team, optionally mirroring a Discord role")
+	@app_commands.describe(name="Team name", role="Keep the team's members in sync with this role")
+	@app_commands.guild_only()
+	@traced
+	async def admin_team_create(interaction: discord.Interaction, name: str, role: discord.Role = None):
+		if not is_admin(interaction):
+			await interaction.response.send_message("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		# role.members is only complete with a fully cached member list
+		if role and (config.LEAN_INTENTS or not interaction.guild.chunked):
+			await interaction.response.send_message("Role-based teams need the server's full member list, which isn't cached "
+													"(lean intents mode, or still loading). Create the team without a role and add "
+													"players with `/admin_team_add`.", ephemeral=True)
+			return
+		team_id = create_team(name, role.id if role else None)
+		if team_id is None:
+			await interaction.response.send_message(f"A team named '{name}' already exists.", ephemeral=True)
+			return
+		if role:
+			set_team_members(team_id, [member.id for member in role.members])
+			await interaction.response.send_message(f"Created team {name} with the {len(role.members)} member(s) of {role.mention}.", ephemeral=True)
+		else:
+			await interaction.response.send_message(f"Created team {name}. Add players with `/admin_team_add`.", ephemeral=True)
+
+	@bot.tree.command(name="admin_team_delete", description="Delete a team")
+	@traced
+	async def admin_team_delete(interaction: discord.Interaction, name: str):
+		if not is_admin(interaction):
+			await interaction.response.send_message("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		team = get_team(name)
+		if team is None:
+			await interaction.response.send_message(f"No team named '{name}'.", ephemeral=True)
+			return
+		delete_team(team[0])
+		await interaction.response.send_message(f"Deleted team {team[1]}.", ephemeral=True)
+
+	@bot.tree.command(name="admin_team_add", description="Add a player to a team")
+	@traced
+	async def admin_team_add(interaction: discord.Interaction, name: str, user: discord.User):
+		if not is_admin(interaction):
+			await interaction.response.send_message("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		team = get_team(name)
+		if team is None:
+			await interaction.response.send_message(f"No team named '{name}'.", ephemeral=True)
+			return
+		if team[2] is not None:
+			await interaction.response.send_message(f"Team {team[1]} mirrors a role, give the role instead.", ephemeral=True)
+			return
+		set_team_members(team[0], [user.id])
+		await interaction.response.send_message(f"Added {user.display_name} to team {team[1]}.", ephemeral=True)
+
+	@bot.tree.command(name="admin_team_remove", description="Remove a player from a team")
+	@traced
+	async def admin_team_remove(interaction: discord.Interaction, name: str, user: discord.User):
+		if not is_admin(interaction):
+			await interaction.response.send_message("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		team = get_team(name)
+		if team is None:
+			await interaction.response.send_message(f"No team named '{name}'.", ephemeral=True)
+			return
+		if remove_team_member(team[0], user.id):
+			await interaction.response.send_message(f"Removed {user.display_name} from team {team[1]}.", ephemeral=True)
+		else:
+			await interaction.response.send_message(f"{user.display_name} is not in team {team[1]}.", ephemeral=True)
+
+	provider_choices = [app_commands.Choice(name=provider.label, value=provider.name) for provider in linked_providers()]
+
+	@bot.tree.command(name="link", description="Link your account on another chess site")
+	@app_commands.describe(site="Chess site of the account", username="Your username on that site")
+	@app_commands.choices(site=provider_choices)
+	@traced
+	async def link(interaction: discord.Interaction, site: app_commands.Choice[str], username: str):
+		with span("defer"):
+			await interaction.response.defer(ephemeral=True)
+		 
+		provider = PROVIDERS[site.value]
+		data = await provider.fetch(username)
+		if not data:
+			await interaction.followup.send(f"Could not find {provider.label} user '{username}'. Please check the spelling.", ephemeral=True)
+			return
+		 
+		with span("db"):
+			link_account(interaction.user.id, provider.name, username)
+			stored = store_provider_ratings(provider.name, [(interaction.user.id, provider.parse(data))])
+		 
+		if stored:
+			await interaction.followup.send(f"Linked your {provider.label} account {username}!", ephemeral=True)
+		else:
+			await interaction.followup.send(f"Linked your {provider.label} account {username}, but there was an error storing your ratings. They will be updated with the next refresh.", ephemeral=True)
+
+	@bot.tree.command(name="unlink", description="Unlink your account on another chess site")
+	@app_commands.describe(site="Chess site of the account")
+	@app_commands.choices(site=provider_choices)
+	@traced
+	async def unlink(interaction: discord.Interaction, site: app_commands.Choice[str]):
+		provider = PROVIDERS[site.value]
+		if unlink_account(interaction.user.id, provider.name):
+			await interaction.response.send_message(f"Unlinked your {provider.label} account.", ephemeral=True)
+		else:
+			await interaction.response.send_message(f"You have no linked {provider.label} account.", ephemeral=True)
+
 	@bot.tree.command(name="unregister", description="Remove yourself from the Chess.com leaderboard")
+	@traced
 	async def unregister(interaction: discord.Interaction):
 		if unregister_user(interaction.user.id):
 			await interaction.response.send_message("You have been removed from the Chess.com leaderboard.", ephemeral=True)
@@ -77,124 +264,85 @@ def register_commands(bot):
 			await interaction.response.send_message("You are not registered in the leaderboard.", ephemeral=True)
 	
 	@bot.tree.command(name="leaderboard", description="Show Chess.com ratings leaderboard")
-	@app_commands.describe(category="Rating category to display")
+	@app_commands.describe(category="Rating category to display, or Teams for the team leaderboard",
+						around_me="Open on the page with your own position",
+						rank="Open on the page containing this rank",
+						team_category="Rating category teams are ranked by (Teams only, default Overall)",
+						metric="How member ratings are combined (Teams only, default Average)")
 	@app_commands.choices(category=[
+		app_commands.Choice(name="Rapid", value="rapid"),
+		app_commands.Choice(name="Blitz", value="blitz"),
+		app_commands.Choice(name="Bullet", value="bullet"),
+		app_commands.Choice(name="Puzzle", value="puzzle"),
+		app_commands.Choice(name="Puzzle Rush", value="puzzle_rush"),
+		app_commands.Choice(name="Overall", value="overall"),
+		app_commands.Choice(name="Teams", value="team")
+	], team_category=[
 		app_commands.Choice(name="Rapid", value="rapid"),
 		app_commands.Choice(name="Blitz", value="blitz"),
 		app_commands.Choice(name="Bullet", value="bullet"),
 		app_commands.Choice(name="Puzzle", value="puzzle"),
 		app_commands.Choice(name="Puzzle Rush", value="puzzle_rush"),
 		app_commands.Choice(name="Overall", value="overall")
+	], metric=[
+		app_commands.Choice(name="Average", value="average"),
+		app_commands.Choice(name="Median", value="median"),
+		app_commands.Choice(name="Top members sum", value="top_sum")
 	])
-	async def leaderboard(interaction: discord.Interaction, category: app_commands.Choice[str]):
-		await interaction.response.defer()
-		 
-		category_value = category.value
-		users = get_leaderboard_data(category_value)
-		# Add trophy emoji for top 3
-		trophies = ["🏆", "🥈", "🥉"]
-		
-		if category_value == "puzzle_rush":
-
-			async def get_page(page: int,users):
-				# Create embed
-				emb = discord.Embed(
-					title="Chess.com Puzzle Rush Leaderboard",
-					description="Top puzzle rush survival scores",
-					color=0x00BFFF,
-					timestamp=datetime.datetime.now()
-				)
-				users = list(enumerate(users, start=1))
-				offset = (page-1) * 25
-				for index, user in users[offset:offset+25]:
-					print(index)
-					discord_id, chess_username, score = user
-					n = Pagination.compute_total_pages(len(users), 25)
-					emb.add_field(
-						name=f"{index}{chess_username}",
-						value=f"Score: **{score}**",
-						inline=False
-					)
-				emb.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/5987/5987898.png")
-				return emb, n
-			
-			await Pagination(interaction, get_page,users).navegate()
-
-		elif category_value == "overall":
-			# Process for overall ratings
-			user_ratings = []
-			for user in users:
-				discord_id, chess_username, rapid, blitz, bullet, puzzle = user
-				ratings = [r for r in [rapid, blitz, bullet] if r is not None]
-				avg_rating = sum(ratings) / len(ratings) if ratings else 0
-				user_ratings.append((discord_id, chess_username, rapid, blitz, bullet, avg_rating))
-			 
-			# Sort by average rating
-			user_ratings.sort(key=lambda x: x[5], reverse=True)
-
-			async def get_page(page: int,users):
-				# Create embed
-				emb = discord.Embed(
-					title="Chess.com Overall Leaderboard",
-					description="Top Overall scores",
-					color=0x00BFFF,
-					timestamp=datetime.datetime.now()
-				)
-				users = list(enumerate(users, start=1))
-				print(users)
-				offset = (page-1) * 25
-				for index, user in users[offset:offset+25]:
-					discord_id, chess_username, rapid, blitz, bullet, avg_rating = user
-					print(index)
-					n = Pagination.compute_total_pages(len(users), 25)
-					emb.add_field(
-						name=f"{index}. {chess_username}",
-						value=f"Average: **{int(avg_rating)}**\n"
-							f"Rapid: {rapid or 'N/A'} | Blitz: {blitz or 'N/A'} | "
-							f"Bullet: {bullet or 'N/A'}",
-						inline=False
-					)
-				emb.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/5987/5987898.png")
-				return emb, n
-			
-			await Pagination(interaction, get_page,user_ratings).navegate()
-			 
+	@traced
+	async def leaderboard(interaction: discord.Interaction, category: app_commands.Choice[str],
+					   	around_me: bool = False, rank: app_commands.Range[int, 1] = None,
+					   	team_category: app_commands.Choice[str] = None, metric: app_commands.Choice[str] = None):
+		with span("defer"):
+			await interaction.response.defer()
+		 
+		# Only the first page is loaded, later pages are fetched as the user flips
+		if category.value == "team":
+			if around_me:
+				await interaction.followup.send("`around_me` can't be used with the team leaderboard, use `rank` instead.", ephemeral=True)
+				return
+			cursor = TeamLeaderboardCursor(team_category.value if team_category else "overall",
+										metric.value if metric else "average")
 		else:
-			# Process for specific category
-			# Filter out None values and sort
-			filtered_users = [(u[0], u[1], u[2]) for u in users if u[2] is not None]
-			filtered_users.sort(key=lambda x: x[2], reverse=True)
-
-			async def get_page(page: int,users,category_value):
-				# Create embed
-				emb = discord.Embed(
-					title=f"Chess.com {category_value.capitalize()} Ratings Leaderboard",
-					description=f"Top {category_value.capitalize()} scores",
-					color=0x00BFFF,
-					timestamp=datetime.datetime.now()
-				)
-				users = list(enumerate(users, start=1))
-				offset = (page-1) * 25
-				for index, user in users[offset:offset+25]:
-					discord_id, chess_username, rating = user
-					n = Pagination.compute_total_pages(len(users), 25)
-					emb.add_field(
-						name=f"{index}. {chess_username}",
-						value=f"Rating: **{rating}**",
-						inline=False
-					)
-				emb.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/5987/5987898.png")
-				return emb, n
-
-			await Pagination(interaction, get_page,filtered_users,category_value).navegate()
+			cursor = LeaderboardCursor(category.value)
+		if around_me:
+			rank = engine.rank_of(category.value, interaction.user.id)
+			if rank is None:
+				await interaction.followup.send(f"You are not ranked on the {category.name} leaderboard.", ephemeral=True)
+				return
+			cursor.highlight = interaction.user.id
+		if rank:
+			cursor.go_to_rank(rank)
+		else:
+			cursor.first()
+		if config.PERSISTENT_LEADERBOARDS:
+			await send_persistent_leaderboard(interaction, cursor)
+		else:
+			await Pagination(interaction, get_team_page if category.value == "team" else get_page, cursor).navegate()
 
 	@bot.tree.command(name="profile", description="Show Chess.com profile details for a user")
-	@app_commands.describe(user="Discord user to show profile for (leave empty for your own profile)")
-	async def profile(interaction: discord.Interaction, user: discord.User = None):
-		await interaction.response.defer()
+	@app_commands.describe(user="Discord user to show profile for (leave empty for your own profile)",
+						username="Registered Chess.com username to show profile for")
+	@app_commands.autocomplete(username=registered_username_autocomplete)
+	@traced
+	async def profile(interaction: discord.Interaction, user: discord.User = None, username: str = None):
+		with span("defer"):
+			await interaction.response.defer()
+		 
+		if username and not user:
+			discord_id = usernames.lookup(username) or get_user_id(username)
+			if discord_id is None:
+				await interaction.followup.send(f"No player is registered with Chess.com username '{username}'.", ephemeral=True)
+				return
+			try:
+				user = (interaction.guild and interaction.guild.get_member(discord_id)) or await bot.fetch_user(discord_id)
+			except discord.NotFound:
+				await interaction.followup.send(f"The Discord account registered with Chess.com username '{username}' no longer exists.", ephemeral=True)
+				return
 		 
 		target_user = user or interaction.user
-		user_data = get_user_profile(target_user.id)
+		with span("db"):
+			user_data = get_user_profile(target_user.id)
 		 
 		if not user_data:
 			await interaction.followup.send(
@@ -233,36 +381,206 @@ def register_commands(bot):
 		 
 		embed.add_field(name="Average Rating", value=f"**{avg_rating}**", inline=True)
 		 
+		# Add rank and percentile in every category, all from the in-memory rankings
+		with span("rank_lookup"):
+			standings = engine.standings(target_user.id)
+		category_names = [("rapid", "Rapid"), ("blitz", "Blitz"), ("bullet", "Bullet"),
+						("puzzle", "Puzzle"), ("puzzle_rush", "Puzzle Rush"), ("overall", "Overall")]
+		rankings_value = ""
+		for category, name in category_names:
+			if category in standings:
+				rank, players = standings[category]
+				rankings_value += f"**{name}:** #{rank} of {players} (top {max(round(rank / players * 100), 1)}%)\n"
+			else:
+				rankings_value += f"**{name}:** Unranked\n"
+		 
+		embed.add_field(name="Rankings", value=rankings_value, inline=False)
+		 
+		# Add accounts linked on other sites
+		with span("db"):
+			accounts = get_user_accounts(target_user.id)
+		for provider_name, account_username, *account_ratings, account_updated in accounts:
+			provider = PROVIDERS.get(provider_name)
+			if provider is None:
+				continue
+			account_rapid, account_blitz, account_bullet, account_puzzle, account_storm = account_ratings
+			embed.add_field(
+				name=f"{provider.label}: {account_username}",
+				value=(
+					f"[Profile]({provider.profile_url(account_username)})\n"
+					f"**Rapid:** {account_rapid or 'N/A'} | **Blitz:** {account_blitz or 'N/A'} | "
+					f"**Bullet:** {account_bullet or 'N/A'}\n"
+					f"**Puzzle:** {account_puzzle or 'N/A'} | **Puzzle Storm:** {account_storm or 'N/A'}"
+				),
+				inline=False
+			)
+		 
 		# Add last updated timestamp
 		last_updated_dt = datetime.datetime.fromisoformat(last_updated)
 		embed.set_footer(text=f"Last updated • {last_updated_dt.strftime('%Y-%m-%d %H:%M')}")
 		 
-		await interaction.followup.send(embed=embed)
+		with span("followup_send"):
+			await interaction.followup.send(embed=embed)
 	
+	refresh_user_cooldown = Cooldown(config.REFRESH_USER_LIMIT, config.REFRESH_USER_WINDOW_MINUTES * 60)
+	refresh_guild_cooldown = Cooldown(config.REFRESH_GUILD_LIMIT, config.REFRESH_GUILD_WINDOW_MINUTES * 60)
+
 	@bot.tree.command(name="refresh", description="Manually refresh your Chess.com ratings")
+	@traced
 	async def refresh(interaction: discord.Interaction):
-		await interaction.response.defer(ephemeral=True)
+		with span("defer"):
+			await interaction.response.defer(ephemeral=True)
 		 
 		from database import get_user
-		chess_username = get_user(interaction.user.id)
+		with span("db"):
+			chess_username = get_user(interaction.user.id)
 		 
 		if not chess_username:
 			await interaction.followup.send("You are not registered. Use `/register` to link your Chess.com account.", ephemeral=True)
 			return
 		 
+		now = datetime.datetime.now()
+		guild_key = interaction.guild_id or interaction.user.id
+		retry_after = max(refresh_user_cooldown.retry_after(interaction.user.id),
+						refresh_guild_cooldown.retry_after(guild_key))
+		next_allowed = now + datetime.timedelta(seconds=retry_after)
+		 
+		# Answer from the database if the stored ratings are still fresh
+		with span("db"):
+			user_data = get_user_profile(interaction.user.id)
+		if user_data:
+			chess_username, rapid, blitz, bullet, puzzle, puzzle_rush, last_updated = user_data
+			last_updated_dt = datetime.datetime.fromisoformat(last_updated)
+			fresh_until = last_updated_dt + datetime.timedelta(minutes=config.REFRESH_FRESHNESS_MINUTES)
+			if now < fresh_until:
+				next_allowed = max(fresh_until, next_allowed)
+				await interaction.followup.send(
+					f"Your ratings are already up to date (updated <t:{int(last_updated_dt.timestamp())}:R>).\n"
+					f"Rapid: {rapid or 'N/A'} | Blitz: {blitz or 'N/A'} | Bullet: {bullet or 'N/A'} | "
+					f"Puzzle: {puzzle or 'N/A'} | Puzzle Rush: {puzzle_rush or 'N/A'}\n"
+					f"You can refresh again <t:{int(next_allowed.timestamp())}:R>.",
+					ephemeral=True
+				)
+				return
+		 
+		if retry_after:
+			await interaction.followup.send(f"Too many refreshes, you can refresh again <t:{int(next_allowed.timestamp())}:R>.", ephemeral=True)
+			return
+		refresh_user_cooldown.hit(interaction.user.id)
+		refresh_guild_cooldown.hit(guild_key)
+		 
 		# Fetch latest data
-		chess_data = await fetch_chess_data(chess_username)
+		chess_data = await primary_provider.fetch(chess_username)
 		if not chess_data:
 			await interaction.followup.send(f"Error fetching data from Chess.com for user {chess_username}.", ephemeral=True)
 			return
 		 
 		# Store updated ratings
-		if store_user_ratings(interaction.user.id, chess_data):
-			await interaction.followup.send(f"Successfully refreshed your Chess.com ratings!", ephemeral=True)
+		with span("db"):
+			stored = store_user_ratings(interaction.user.id, primary_provider.parse(chess_data))
+		if stored:
+			next_allowed = max(now + datetime.timedelta(minutes=config.REFRESH_FRESHNESS_MINUTES),
+							now + datetime.timedelta(seconds=refresh_user_cooldown.retry_after(interaction.user.id)))
+			await interaction.followup.send(f"Successfully refreshed your Chess.com ratings! "
+									 	f"You can refresh again <t:{int(next_allowed.timestamp())}:R>.", ephemeral=True)
 		else:
 			await interaction.followup.send("Error updating your ratings. Please try again later.", ephemeral=True)
 	
+	@bot.tree.command(name="export", description="Export a leaderboard or the ratings table as a file")
+	@app_commands.describe(table="Leaderboard category or the full ratings table",
+						format="File format", compress="Compress the file with gzip")
+	@app_commands.choices(table=[
+		app_commands.Choice(name="Rapid", value="rapid"),
+		app_commands.Choice(name="Blitz", value="blitz"),
+		app_commands.Choice(name="Bullet", value="bullet"),
+		app_commands.Choice(name="Puzzle", value="puzzle"),
+		app_commands.Choice(name="Puzzle Rush", value="puzzle_rush"),
+		app_commands.Choice(name="Overall", value="overall"),
+		app_commands.Choice(name="All ratings", value="ratings")
+	], format=[
+		app_commands.Choice(name="CSV", value="csv"),
+		app_commands.Choice(name="NDJSON", value="ndjson")
+	])
+	@traced
+	async def export(interaction: discord.Interaction, table: app_commands.Choice[str],
+				  	format: app_commands.Choice[str], compress: bool = False):
+		with span("defer"):
+			await interaction.response.defer(ephemeral=True)
+		if not is_admin(interaction):
+			await interaction.followup.send("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		 
+		size_limit = interaction.guild.filesize_limit if interaction.guild else config.EXPORT_SIZE_LIMIT
+		# The export streams rows from SQLite to temporary files, off the event loop
+		paths = await asyncio.to_thread(write_export, table.value, format.value, compress, size_limit)
+		extension = f".{format.value}" + (".gz" if compress else "")
+		files = []
+		try:
+			for number, path in enumerate(paths, start=1):
+				suffix = f"_part{number}" if len(paths) > 1 else ""
+				files.append(discord.File(path, filename=f"{table.value}{suffix}{extension}"))
+			# Discord allows 10 attachments per message
+			for start in range(0, len(files), 10):
+				await interaction.followup.send(
+					f"{table.name} export" + (f" ({len(files)} parts)" if len(files) > 1 else ""),
+					files=files[start:start + 10],
+					ephemeral=True
+				)
+		finally:
+			for file in files:
+				file.close()
+			for path in paths:
+				os.remove(path)
+
+	@bot.tree.command(name="admin_latency", description="Show rolling command latency percentiles and event loop stalls")
+	@traced
+	async def admin_latency(interaction: discord.Interaction):
+		if not is_admin(interaction):
+			await interaction.response.send_message("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		 
+		lines = [f"/{command}: p50 {p['p50'] * 1000:.0f}ms | p95 {p['p95'] * 1000:.0f}ms | "
+				f"p99 {p['p99'] * 1000:.0f}ms ({p['count']} calls)"
+				for command, p in stats.summary().items() if p]
+		if not lines:
+			lines.append("No interactions recorded yet.")
+		lag = watchdog.lag.percentiles("event_loop")
+		if lag:
+			lines.append(f"\nEvent loop lag: p50 {lag['p50'] * 1000:.0f}ms | p95 {lag['p95'] * 1000:.0f}ms | "
+						f"p99 {lag['p99'] * 1000:.0f}ms")
+		for (filename, lineno, function), stalls, total, longest in watchdog.top(5):
+			lines.append(f"`{filename}:{lineno}` {function}: {stalls} stall(s), "
+						f"{total * 1000:.0f}ms total, longest {longest * 1000:.0f}ms")
+		await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+	@bot.tree.command(name="admin_profile", description="Profile the bot for a while and upload the report")
+	@app_commands.describe(seconds="How long to profile", mode="What to profile")
+	@app_commands.choices(mode=[
+		app_commands.Choice(name="CPU and memory", value="both"),
+		app_commands.Choice(name="CPU", value="cpu"),
+		app_commands.Choice(name="Memory", value="memory")
+	])
+	@traced
+	async def admin_profile(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, config.PROFILE_MAX_SECONDS] = 60,
+						mode: app_commands.Choice[str] = None):
+		if not is_admin(interaction):
+			await interaction.response.send_message("Only admins are allowed to execute this command", ephemeral=True)
+			return
+		mode = mode.value if mode else "both"
+		await interaction.response.defer(ephemeral=True)
+		try:
+			report = await profiler.profile(seconds, cpu=mode != "memory", memory=mode != "cpu")
+		except RuntimeError as e:
+			await interaction.followup.send(str(e), ephemeral=True)
+			return
+		await interaction.followup.send(
+			f"Profile of the last {seconds}s",
+			file=discord.File(io.BytesIO(report.encode()), filename="profile.txt"),
+			ephemeral=True
+		)
+
 	@bot.tree.command(name="help", description="Show available commands and information")
+	@traced
 	async def help_command(interaction: discord.Interaction):
 		embed = discord.Embed(
 			title="Chess.com Leaderboard Bot - Help",
@@ -280,8 +598,21 @@ def register_commands(bot):
 				"value": "Remove yourself from the leaderboard system"
 			},
 			{
-				"name": "/leaderboard <category>",
-				"value": "Show the leaderboard for a specific rating category (Rapid, Blitz, Bullet, Puzzle, Overall)"
+				"name": "/leaderboard <category> [around_me] [rank]",
+				"value": "Show the leaderboard for a specific rating category (Rapid, Blitz, Bullet, Puzzle, Overall), "
+						"optionally opening on your own position or a given rank"
+			},
+			{
+				"name": "/leaderboard Teams [team_category] [metric]",
+				"value": "Rank teams by the average, median or top-member sum of their players' ratings"
+			},
+			{
+				"name": "/link <site> <username>",
+				"value": "Link your account on another chess site (Lichess), shown on your profile"
+			},
+			{
+				"name": "/unlink <site>",
+				"value": "Remove a linked account"
 			},
 			{
 				"name": "/profile [user]",
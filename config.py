@@ -0,0 +1,117 @@
+# config.py - Runtime settings
+import os
+from dotenv import load_dotenv
+
+try:
+	import token_bot
+except ImportError:
+	# Headless tools (worker, CLI) can run without Discord credentials
+	token_bot = None
+
+load_dotenv()
+
+def _setting(name, default, cast=str):
+	"""Read a setting from token_bot, then the environment, then fall back to the default"""
+	value = getattr(token_bot, name, None)
+	if value is None:
+		value = os.getenv(name)
+	if value is None:
+		return default
+	return cast(value)
+
+def _flag(value):
+	"""Parse a boolean setting"""
+	return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+def _id_set(value):
+	"""Parse a comma-separated list (or iterable) of Discord ids"""
+	if isinstance(value, str):
+		value = value.split(",")
+	return {int(item) for item in value if str(item).strip()}
+
+# Where the rating refresh runs: "inline" inside the bot process, or "worker"
+# when worker.py does the fetching and the bot only syncs roles
+REFRESH_MODE = _setting("REFRESH_MODE", "inline")
+REFRESH_INTERVAL_HOURS = _setting("REFRESH_INTERVAL_HOURS", 24, float)
+# Delay between Chess.com requests during a refresh, to avoid rate limiting
+REFRESH_REQUEST_DELAY = _setting("REFRESH_REQUEST_DELAY", 2, float)
+# How often the bot checks the database for runs finished by the worker
+REFRESH_POLL_MINUTES = _setting("REFRESH_POLL_MINUTES", 5, float)
+
+# /refresh answers from the database while the stored ratings are younger than this
+REFRESH_FRESHNESS_MINUTES = _setting("REFRESH_FRESHNESS_MINUTES", 60, float)
+# Manual refreshes allowed per user, and per guild, within each window
+REFRESH_USER_LIMIT = _setting("REFRESH_USER_LIMIT", 1, int)
+REFRESH_USER_WINDOW_MINUTES = _setting("REFRESH_USER_WINDOW_MINUTES", 30, float)
+REFRESH_GUILD_LIMIT = _setting("REFRESH_GUILD_LIMIT", 20, int)
+REFRESH_GUILD_WINDOW_MINUTES = _setting("REFRESH_GUILD_WINDOW_MINUTES", 10, float)
+
+# Shared Chess.com request limits: concurrent requests and seconds between request starts
+CHESS_API_MAX_CONCURRENCY = _setting("CHESS_API_MAX_CONCURRENCY", 4, int)
+CHESS_API_MIN_INTERVAL = _setting("CHESS_API_MIN_INTERVAL", 0.25, float)
+
+# Lichess API used for linked Lichess accounts; point the URL at a local stand-in to test.
+# Usernames per bulk request (Lichess allows up to 300) and seconds between requests,
+# which Lichess asks to be made one at a time. A personal token raises the limits.
+LICHESS_API_URL = _setting("LICHESS_API_URL", "https://lichess.org")
+LICHESS_API_TOKEN = _setting("LICHESS_API_TOKEN", None)
+LICHESS_BATCH_SIZE = _setting("LICHESS_BATCH_SIZE", 300, int)
+LICHESS_MIN_INTERVAL = _setting("LICHESS_MIN_INTERVAL", 1.0, float)
+
+# Discord user ids allowed to run admin commands
+ADMIN_IDS = _setting("ADMIN_IDS", {896650341561548801, 1094139004766666763, 436652531582631944}, _id_set)
+# Rows fetched concurrently and written in one transaction by admin_bulk_register
+BULK_REGISTER_BATCH_SIZE = _setting("BULK_REGISTER_BATCH_SIZE", 50, int)
+# Largest CSV admin_bulk_register accepts, the attachment is read into memory
+BULK_REGISTER_MAX_BYTES = _setting("BULK_REGISTER_MAX_BYTES", 2 * 1024 * 1024, int)
+
+# Attachment size used by /export outside guilds (guilds report their own limit)
+EXPORT_SIZE_LIMIT = _setting("EXPORT_SIZE_LIMIT", 25 * 1024 * 1024, int)
+
+# Interactions slower than this are logged with their span breakdown
+TRACE_SLOW_MS = _setting("TRACE_SLOW_MS", 1500, float)
+# Number of recent interactions per command kept for latency percentiles
+TRACE_WINDOW = _setting("TRACE_WINDOW", 500, int)
+
+# Leaderboard buttons carry their page in the custom_id and keep working after restarts
+PERSISTENT_LEADERBOARDS = _setting("PERSISTENT_LEADERBOARDS", False, _flag)
+
+# Minimal intents with no member chunking; only registered players are cached, on demand
+LEAN_INTENTS = _setting("LEAN_INTENTS", False, _flag)
+
+# Run as an AutoShardedClient. SHARD_COUNT is the total across all processes
+# (None lets Discord recommend it); SHARD_IDS are the shards this process runs
+SHARDED = _setting("SHARDED", False, _flag)
+SHARD_COUNT = _setting("SHARD_COUNT", None, int)
+SHARD_IDS = _setting("SHARD_IDS", None, lambda value: sorted(_id_set(value)))
+
+# Root log level, per-logger overrides ("discord=WARNING,chess_bot.tracing=DEBUG")
+# and "text" or "json" output
+LOG_LEVEL = _setting("LOG_LEVEL", "INFO")
+LOG_LEVELS = _setting("LOG_LEVELS", "")
+LOG_FORMAT = _setting("LOG_FORMAT", "text")
+# Sampled debug records (extra={"sample": key}) let through per key, at most one per interval
+LOG_SAMPLE_SECONDS = _setting("LOG_SAMPLE_SECONDS", 10, float)
+
+# Snapshot of the rankings, username index and role ids, loaded at startup when
+# it matches the database; written on shutdown and every interval (0 disables)
+SNAPSHOT_PATH = _setting("SNAPSHOT_PATH", "state.snapshot")
+SNAPSHOT_INTERVAL_MINUTES = _setting("SNAPSHOT_INTERVAL_MINUTES", 15, float)
+
+# Opt-in watchdog logging the stack of whatever blocks the event loop for longer than the threshold
+STALL_WATCHDOG = _setting("STALL_WATCHDOG", False, _flag)
+STALL_THRESHOLD_MS = _setting("STALL_THRESHOLD_MS", 250, float)
+STALL_CHECK_INTERVAL_MS = _setting("STALL_CHECK_INTERVAL_MS", 100, float)
+
+# /admin_profile: milliseconds between CPU samples, frames kept per traced allocation, longest window
+PROFILE_SAMPLE_INTERVAL_MS = _setting("PROFILE_SAMPLE_INTERVAL_MS", 10, float)
+PROFILE_TRACEMALLOC_FRAMES = _setting("PROFILE_TRACEMALLOC_FRAMES", 1, int)
+PROFILE_MAX_SECONDS = _setting("PROFILE_MAX_SECONDS", 300, int)
+
+# Channels that get a digest of rating changes after each refresh (empty disables),
+# and how many players each section of the digest lists
+DIGEST_CHANNEL_IDS = _setting("DIGEST_CHANNEL_IDS", set(), _id_set)
+DIGEST_SIZE = _setting("DIGEST_SIZE", 5, int)
+
+# Members summed by the "top N sum" team leaderboard metric
+TEAM_TOP_N = _setting("TEAM_TOP_N", 5, int)
@@ -0,0 +1,32 @@
+# cooldowns.py - Sliding-window cooldowns for rate-limited commands
+import time
+from collections import deque
+
+class Cooldown:
+	"""Allow `rate` uses every `per` seconds for each key (a user or guild id)"""
+
+	def __init__(self, rate, per):
+		self.rate = rate
+		self.per = per
+		self._uses = {}
+
+	def _window(self, key, now):
+		uses = self._uses.get(key)
+		if uses is None:
+			uses = self._uses[key] = deque()
+		while uses and uses[0] <= now - self.per:
+			uses.popleft()
+		return uses
+
+	def retry_after(self, key, now=None):
+		"""Seconds until key may use the command again, 0 if it may now"""
+		now = time.time() if now is None else now
+		uses = self._window(key, now)
+		if len(uses) < self.rate:
+			return 0
+		return uses[0] + self.per - now
+
+	def hit(self, key, now=None):
+		"""Record a use of the command"""
+		now = time.time() if now is None else now
+		self._window(key, now).append(now)
@@ -7,6 +7,25 @@ logger = logging.getLogger('chess_bot.database')
 
 DB_PATH = 'chess_leaderboard.db'
 
+# Callbacks notified after each committed write, see add_listener
+_listeners = []
+
+# Average of the rapid, blitz and bullet ratings a player has (0 when none)
+OVERALL_AVERAGE = '''COALESCE(
+	(COALESCE(rapid_rating, 0) + COALESCE(blitz_rating, 0) + COALESCE(bullet_rating, 0)) * 1.0
+	/ NULLIF((rapid_rating IS NOT NULL) + (blitz_rating IS NOT NULL) + (bullet_rating IS NOT NULL), 0),
+	0)'''
+
+# Sort key of each leaderboard category
+LEADERBOARD_SCORES = {
+	"rapid": "rapid_rating",
+	"blitz": "blitz_rating",
+	"bullet": "bullet_rating",
+	"puzzle": "puzzle_rating",
+	"puzzle_rush": "puzzle_rush_score",
+	"overall": OVERALL_AVERAGE,
+}
+
 def setup_database():
 	"""Initialize database tables if they don't exist"""
 	conn = sqlite3.connect(DB_PATH)
@@ -35,14 +54,102 @@ def setup_database():
 		FOREIGN KEY (discord_id) REFERENCES users (discord_id)
 	)
 	''')
-	
+
+	# Create refresh runs table, used by the worker to tell the bot a refresh finished
+	cursor.execute('''
+	CREATE TABLE IF NOT EXISTS refresh_runs (
+		id INTEGER PRIMARY KEY AUTOINCREMENT,
+		source TEXT NOT NULL,
+		started_at TEXT NOT NULL,
+		finished_at TEXT,
+		updated_count INTEGER NOT NULL DEFAULT 0,
+		total_count INTEGER NOT NULL DEFAULT 0
+	)
+	''')
+	# Rating-change digest of each run (JSON), added after the table was introduced
+	cursor.execute("PRAGMA table_info(refresh_runs)")
+	if "digest" not in [column[1] for column in cursor.fetchall()]:
+		cursor.execute("ALTER TABLE refresh_runs ADD COLUMN digest TEXT")
+
+	# Create personal bests table, the best rating seen per player and category
+	cursor.execute('''
+	CREATE TABLE IF NOT EXISTS personal_bests (
+		discord_id INTEGER NOT NULL,
+		category TEXT NOT NULL,
+		rating INTEGER NOT NULL,
+		achieved_at TEXT NOT NULL,
+		PRIMARY KEY (discord_id, category)
+	)
+	''')
+
+	# Create teams tables, a team is an explicit list of players or mirrors a Discord role
+	cursor.execute('''
+	CREATE TABLE IF NOT EXISTS teams (
+		id INTEGER PRIMARY KEY AUTOINCREMENT,
+		name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+		role_id INTEGER
+	)
+	''')
+	cursor.execute('''
+	CREATE TABLE IF NOT EXISTS team_members (
+		team_id INTEGER NOT NULL,
+		discord_id INTEGER NOT NULL,
+		PRIMARY KEY (team_id, discord_id),
+		FOREIGN KEY (team_id) REFERENCES teams (id)
+	)
+	''')
+
+	# Create linked accounts tables: one account per rating provider other than
+	# Chess.com (whose account stays in users) and its latest ratings
+	cursor.execute('''
+	CREATE TABLE IF NOT EXISTS linked_accounts (
+		discord_id INTEGER NOT NULL,
+		provider TEXT NOT NULL,
+		username TEXT NOT NULL,
+		linked_at TEXT NOT NULL,
+		PRIMARY KEY (discord_id, provider)
+	)
+	''')
+	cursor.execute('''
+	CREATE TABLE IF NOT EXISTS provider_ratings (
+		discord_id INTEGER NOT NULL,
+		provider TEXT NOT NULL,
+		rapid_rating INTEGER,
+		blitz_rating INTEGER,
+		bullet_rating INTEGER,
+		puzzle_rating INTEGER,
+		puzzle_rush_score INTEGER,
+		last_updated TEXT NOT NULL,
+		PRIMARY KEY (discord_id, provider)
+	)
+	''')
+
+	# Create meta table for small key/value state shared between processes
+	cursor.execute('''
+	CREATE TABLE IF NOT EXISTS meta (
+		key TEXT PRIMARY KEY,
+		value TEXT
+	)
+	''')
+
+	# Index for the latest-ratings lookup
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_ratings_user ON ratings (discord_id, last_updated)")
+	# Leaderboards are served by the ranking engine, so the per-category score
+	# indexes of the old keyset pagination only slowed down every ratings write
+	for category in LEADERBOARD_SCORES:
+		cursor.execute(f"DROP INDEX IF EXISTS idx_ratings_{category}")
+
+	# WAL lets the bot keep reading while a worker process writes
+	cursor.execute("PRAGMA journal_mode=WAL")
+
 	conn.commit()
 	conn.close()
 	logger.info("Database setup complete!")
 
 def get_connection():
 	"""Get a database connection"""
-	return sqlite3.connect(DB_PATH)
+	# Wait for locks held by other processes instead of failing immediately
+	return sqlite3.connect(DB_PATH, timeout=30)
 
 def get_user(discord_id):
 	"""Get a user's Chess.com username"""
@@ -53,11 +160,17 @@ def get_user(discord_id):
 	conn.close()
 	return result[0] if result else None
 
-def register_user(discord_id, chess_username):
-	"""Register or update a user"""
+def get_user_id(chess_username):
+	"""Get the discord_id registered with a Chess.com username (any case), or None"""
 	conn = get_connection()
 	cursor = conn.cursor()
-	
+	cursor.execute("SELECT discord_id FROM users WHERE chess_username = ? COLLATE NOCASE", (chess_username,))
+	result = cursor.fetchone()
+	conn.close()
+	return result[0] if result else None
+
+def _upsert_user(cursor, discord_id, chess_username):
+	"""Insert or update a user in the caller's transaction"""
 	# Check if user exists
 	cursor.execute("SELECT chess_username FROM users WHERE discord_id = ?", (discord_id,))
 	existing_user = cursor.fetchone()
@@ -65,36 +178,33 @@ def register_user(discord_id, chess_username):
 	if existing_user:
 		cursor.execute("UPDATE users SET chess_username = ? WHERE discord_id = ?",
 				  	(chess_username, discord_id))
-		result = "updated"
-	else:
-		cursor.execute("INSERT INTO users (discord_id, chess_username, join_date) VALUES (?, ?, ?)",
-				  	(discord_id, chess_username, datetime.datetime.now().isoformat()))
-		result = "registered"
-	
-	conn.commit()
-	conn.close()
-	return result
+		return "updated"
+	# Ratings a refresh stored after the player unregistered; a new registration starts unrated
+	cursor.execute("DELETE FROM ratings WHERE discord_id = ?", (discord_id,))
+	cursor.execute("INSERT INTO users (discord_id, chess_username, join_date) VALUES (?, ?, ?)",
+			  	(discord_id, chess_username, datetime.datetime.now().isoformat()))
+	return "registered"
 
-def unregister_user_chess_com(chess_user):
-	"""Remove a user from the system"""
+def register_user(discord_id, chess_username):
+	"""Register or update a user"""
 	conn = get_connection()
 	cursor = conn.cursor()
 	
-	# Check if user exists
-	cursor.execute("SELECT discord_id FROM users WHERE chess_username = ?", (chess_user,))
-	existing_user = cursor.fetchone()
-	
-	if not existing_user:
-		conn.close()
-		return False
-	discord_id = existing_user[0]
-	# Delete user data
-	cursor.execute("DELETE FROM ratings WHERE discord_id = ?", (discord_id,))
-	cursor.execute("DELETE FROM users WHERE discord_id = ?", (discord_id,))
+	result = _upsert_user(cursor, discord_id, chess_username)
 	
+	version = bump_data_version(cursor)
 	conn.commit()
 	conn.close()
-	return True
+	notify_listeners("register", version, discord_id=discord_id, chess_username=chess_username)
+	return result
+
+def _delete_user(cursor, discord_id):
+	"""Delete a user with their ratings and linked accounts in the caller's transaction"""
+	cursor.execute("DELETE FROM ratings WHERE discord_id = ?", (discord_id,))
+	cursor.execute("DELETE FROM provider_ratings WHERE discord_id = ?", (discord_id,))
+	cursor.execute("DELETE FROM linked_accounts WHERE discord_id = ?", (discord_id,))
+	cursor.execute("DELETE FROM team_members WHERE discord_id = ?", (discord_id,))
+	cursor.execute("DELETE FROM users WHERE discord_id = ?", (discord_id,))
 
 def unregister_user(discord_id):
 	"""Remove a user from the system"""
@@ -110,58 +220,84 @@ def unregister_user(discord_id):
 		return False
 	
 	# Delete user data
-	cursor.execute("DELETE FROM ratings WHERE discord_id = ?", (discord_id,))
-	cursor.execute("DELETE FROM users WHERE discord_id = ?", (discord_id,))
+	_delete_user(cursor, discord_id)
 	
+	version = bump_data_version(cursor)
 	conn.commit()
 	conn.close()
+	notify_listeners("unregister", version, discord_id=discord_id)
 	return True
 
-def store_user_ratings(discord_id, chess_data):
-	"""Store a user's ratings"""
+def _upsert_ratings(cursor, discord_id, ratings):
+	"""Insert or update a user's latest ratings in the caller's transaction"""
+	# Check for existing ratings to update
+	cursor.execute('''
+	SELECT id FROM ratings WHERE discord_id = ?
+	ORDER BY last_updated DESC LIMIT 1
+	''', (discord_id,))
+	
+	existing_rating = cursor.fetchone()
+	
+	if existing_rating:
+		cursor.execute('''
+		UPDATE ratings
+		SET rapid_rating = ?, blitz_rating = ?, bullet_rating = ?,
+			puzzle_rating = ?, puzzle_rush_score = ?, last_updated = ?
+		WHERE id = ?
+		''', (*ratings, datetime.datetime.now().isoformat(), existing_rating[0]))
+	else:
+		# Insert new ratings
+		cursor.execute('''
+		INSERT INTO ratings (discord_id, rapid_rating, blitz_rating, bullet_rating,
+					  	puzzle_rating, puzzle_rush_score, last_updated)
+		VALUES (?, ?, ?, ?, ?, ?, ?)
+		''', (discord_id, *ratings, datetime.datetime.now().isoformat()))
+
+def store_user_ratings(discord_id, ratings):
+	"""Store a user's (rapid, blitz, bullet, puzzle, puzzle_rush) ratings, as parsed by a provider"""
 	try:
-		# Extract ratings with error handling for missing data
-		rapid = chess_data.get('chess_rapid', {}).get('last', {}).get('rating', None)
-		blitz = chess_data.get('chess_blitz', {}).get('last', {}).get('rating', None)
-		bullet = chess_data.get('chess_bullet', {}).get('last', {}).get('rating', None)
-		puzzle = chess_data.get('tactics', {}).get('highest', {}).get('rating', None)
-		puzzle_rush = chess_data.get('puzzle_rush', {}).get('best', {}).get('score', None)
-   	 
 		conn = get_connection()
 		cursor = conn.cursor()
    	 
-		# Check for existing ratings to update
-		cursor.execute('''
-		SELECT id FROM ratings WHERE discord_id = ?
-		ORDER BY last_updated DESC LIMIT 1
-		''', (discord_id,))
-   	 
-		existing_rating = cursor.fetchone()
-   	 
-		if existing_rating:
-			cursor.execute('''
-			UPDATE ratings
-			SET rapid_rating = ?, blitz_rating = ?, bullet_rating = ?,
-				puzzle_rating = ?, puzzle_rush_score = ?, last_updated = ?
-			WHERE id = ?
-			''', (rapid, blitz, bullet, puzzle, puzzle_rush,
-				datetime.datetime.now().isoformat(), existing_rating[0]))
-		else:
-			# Insert new ratings
-			cursor.execute('''
-			INSERT INTO ratings (discord_id, rapid_rating, blitz_rating, bullet_rating,
-						  	puzzle_rating, puzzle_rush_score, last_updated)
-			VALUES (?, ?, ?, ?, ?, ?, ?)
-			''', (discord_id, rapid, blitz, bullet, puzzle, puzzle_rush,
-				datetime.datetime.now().isoformat()))
+		_upsert_ratings(cursor, discord_id, ratings)
    	 
+		version = bump_data_version(cursor)
 		conn.commit()
 		conn.close()
+		notify_listeners("ratings", version, discord_id=discord_id, ratings=ratings)
 		return True
 	except Exception as e:
 		logger.error(f"Error storing ratings: {e}")
 		return False
 
+def register_users_bulk(entries):
+	"""Register users and store their ratings in one transaction
+
+	entries are (discord_id, chess_username, ratings) tuples, ratings as
+	parsed by a provider, and the result is the "registered"/"updated"
+	outcome of each entry.
+	"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	results = []
+	events = []
+	try:
+		for discord_id, chess_username, ratings in entries:
+			results.append(_upsert_user(cursor, discord_id, chess_username))
+			events.append(("register", bump_data_version(cursor),
+						{"discord_id": discord_id, "chess_username": chess_username}))
+			_upsert_ratings(cursor, discord_id, ratings)
+			events.append(("ratings", bump_data_version(cursor),
+						{"discord_id": discord_id, "ratings": ratings}))
+		conn.commit()
+	finally:
+		conn.close()
+	
+	# Each row got its own version, so listeners can apply them one by one
+	for event, version, data in events:
+		notify_listeners(event, version, **data)
+	return results
+
 def get_user_profile(discord_id):
 	"""Get a user's profile data"""
 	conn = get_connection()
@@ -190,9 +326,6 @@ def get_leaderboard_data(category):
 	conn = get_connection()
 	cursor = conn.cursor()
 	if category == "puzzle_rush":
-		conn = sqlite3.connect('chess_leaderboard.db')
-		cursor = conn.cursor()
-		
 		# Fetch puzzle rush scores
 		cursor.execute('''
 		SELECT u.discord_id, u.chess_username, r.puzzle_rush_score
@@ -236,6 +369,70 @@ def get_leaderboard_data(category):
 	conn.close()
 	return results
 
+def iter_leaderboard(category, batch_size=500):
+	"""Yield a leaderboard best first from one sorted query, without loading it all
+
+	Rows are (discord_id, chess_username, score), with the rapid, blitz and
+	bullet ratings before the average for "overall".
+	"""
+	score = LEADERBOARD_SCORES[category]
+	extra_columns = "r.rapid_rating, r.blitz_rating, r.bullet_rating, " if category == "overall" else ""
+	conn = get_connection()
+	try:
+		cursor = conn.cursor()
+		cursor.execute(f'''
+		SELECT r.discord_id, u.chess_username, {extra_columns}{score}
+		FROM ratings r
+		JOIN users u ON u.discord_id = r.discord_id
+		WHERE {score} IS NOT NULL
+		AND r.last_updated = (SELECT MAX(last_updated) FROM ratings WHERE discord_id = r.discord_id)
+		ORDER BY {score} DESC, r.discord_id DESC
+		''')
+		while True:
+			rows = cursor.fetchmany(batch_size)
+			if not rows:
+				return
+			yield from rows
+	finally:
+		conn.close()
+
+def iter_ratings(batch_size=500):
+	"""Yield every row of the ratings table with its username, without loading them all"""
+	conn = get_connection()
+	try:
+		cursor = conn.cursor()
+		cursor.execute('''
+		SELECT r.discord_id, u.chess_username,
+		   	r.rapid_rating, r.blitz_rating, r.bullet_rating,
+		   	r.puzzle_rating, r.puzzle_rush_score, r.last_updated
+		FROM ratings r
+		JOIN users u ON u.discord_id = r.discord_id
+		ORDER BY r.id
+		''')
+		while True:
+			rows = cursor.fetchmany(batch_size)
+			if not rows:
+				return
+			yield from rows
+	finally:
+		conn.close()
+
+def get_latest_ratings():
+	"""Get every registered user with their latest ratings"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute('''
+	SELECT r.discord_id, u.chess_username,
+	   	r.rapid_rating, r.blitz_rating, r.bullet_rating,
+	   	r.puzzle_rating, r.puzzle_rush_score
+	FROM ratings r
+	JOIN users u ON u.discord_id = r.discord_id
+	WHERE r.last_updated = (SELECT MAX(last_updated) FROM ratings WHERE discord_id = r.discord_id)
+	''')
+	results = cursor.fetchall()
+	conn.close()
+	return results
+
 def get_all_users():
 	"""Get all registered users"""
 	conn = get_connection()
@@ -245,4 +442,323 @@ def get_all_users():
 	results = cursor.fetchall()
 	
 	conn.close()
-	return results
\ No newline at end of file
+	return results
+
+def create_team(name, role_id=None):
+	"""Create a team and return its id, or None if the name is taken"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	try:
+		cursor.execute("INSERT INTO teams (name, role_id) VALUES (?, ?)", (name, role_id))
+	except sqlite3.IntegrityError:
+		conn.close()
+		return None
+	team_id = cursor.lastrowid
+	version = bump_data_version(cursor)
+	conn.commit()
+	conn.close()
+	notify_listeners("teams", version)
+	return team_id
+
+def delete_team(team_id):
+	"""Delete a team and its memberships"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("DELETE FROM team_members WHERE team_id = ?", (team_id,))
+	cursor.execute("DELETE FROM teams WHERE id = ?", (team_id,))
+	version = bump_data_version(cursor)
+	conn.commit()
+	conn.close()
+	notify_listeners("teams", version)
+
+def set_team_members(team_id, discord_ids, replace=False):
+	"""Add players to a team, or replace its members with them"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	if replace:
+		cursor.execute("DELETE FROM team_members WHERE team_id = ?", (team_id,))
+	cursor.executemany("INSERT OR IGNORE INTO team_members (team_id, discord_id) VALUES (?, ?)",
+					[(team_id, discord_id) for discord_id in discord_ids])
+	version = bump_data_version(cursor)
+	conn.commit()
+	conn.close()
+	notify_listeners("teams", version)
+
+def remove_team_member(team_id, discord_id):
+	"""Remove a player from a team, returning whether they were a member"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("DELETE FROM team_members WHERE team_id = ? AND discord_id = ?", (team_id, discord_id))
+	if cursor.rowcount == 0:
+		conn.close()
+		return False
+	version = bump_data_version(cursor)
+	conn.commit()
+	conn.close()
+	notify_listeners("teams", version)
+	return True
+
+def get_team(name):
+	"""Get (id, name, role_id) of a team by name (any case)"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("SELECT id, name, role_id FROM teams WHERE name = ?", (name,))
+	result = cursor.fetchone()
+	conn.close()
+	return result
+
+def get_teams():
+	"""Get (id, name, role_id) of every team"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("SELECT id, name, role_id FROM teams")
+	results = cursor.fetchall()
+	conn.close()
+	return results
+
+def get_team_members():
+	"""Get (team_id, discord_id) of every team member, registered or not"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("SELECT team_id, discord_id FROM team_members")
+	results = cursor.fetchall()
+	conn.close()
+	return results
+
+def link_account(discord_id, provider, username):
+	"""Link (or replace) a user's account on a rating provider"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute('''
+	INSERT INTO linked_accounts (discord_id, provider, username, linked_at) VALUES (?, ?, ?, ?)
+	ON CONFLICT (discord_id, provider) DO UPDATE SET username = excluded.username, linked_at = excluded.linked_at
+	''', (discord_id, provider, username, datetime.datetime.now().isoformat()))
+	# Ratings of a previously linked account no longer apply
+	cursor.execute("DELETE FROM provider_ratings WHERE discord_id = ? AND provider = ?", (discord_id, provider))
+	version = bump_data_version(cursor)
+	conn.commit()
+	conn.close()
+	notify_listeners("accounts", version, discord_id=discord_id)
+
+def unlink_account(discord_id, provider):
+	"""Remove a user's account on a provider, False if none was linked"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("DELETE FROM linked_accounts WHERE discord_id = ? AND provider = ?", (discord_id, provider))
+	removed = cursor.rowcount > 0
+	cursor.execute("DELETE FROM provider_ratings WHERE discord_id = ? AND provider = ?", (discord_id, provider))
+	version = bump_data_version(cursor)
+	conn.commit()
+	conn.close()
+	notify_listeners("accounts", version, discord_id=discord_id)
+	return removed
+
+def get_linked_accounts(provider, before=None):
+	"""Get (discord_id, username) of every account linked on a provider
+
+	With before (a datetime), only accounts whose ratings are older than it,
+	or missing.
+	"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	if before is None:
+		cursor.execute("SELECT discord_id, username FROM linked_accounts WHERE provider = ?", (provider,))
+	else:
+		cursor.execute('''
+		SELECT a.discord_id, a.username
+		FROM linked_accounts a
+		LEFT JOIN provider_ratings r ON r.discord_id = a.discord_id AND r.provider = a.provider
+		WHERE a.provider = ? AND (r.last_updated IS NULL OR r.last_updated < ?)
+		''', (provider, before.isoformat()))
+	results = cursor.fetchall()
+	conn.close()
+	return results
+
+def get_user_accounts(discord_id):
+	"""Get (provider, username, rapid, blitz, bullet, puzzle, puzzle_rush, last_updated) of a user's linked accounts
+
+	Ratings and last_updated are None until the account's first refresh.
+	"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute('''
+	SELECT a.provider, a.username,
+		r.rapid_rating, r.blitz_rating, r.bullet_rating,
+		r.puzzle_rating, r.puzzle_rush_score, r.last_updated
+	FROM linked_accounts a
+	LEFT JOIN provider_ratings r ON r.discord_id = a.discord_id AND r.provider = a.provider
+	WHERE a.discord_id = ?
+	ORDER BY a.provider
+	''', (discord_id,))
+	results = cursor.fetchall()
+	conn.close()
+	return results
+
+def store_provider_ratings(provider, entries):
+	"""Store the ratings of linked accounts on a provider in one transaction
+
+	entries are (discord_id, (rapid, blitz, bullet, puzzle, puzzle_rush))
+	pairs, as parsed by the provider.
+	"""
+	try:
+		conn = get_connection()
+		cursor = conn.cursor()
+		now = datetime.datetime.now().isoformat()
+		cursor.executemany('''
+		INSERT OR REPLACE INTO provider_ratings (discord_id, provider, rapid_rating, blitz_rating,
+							bullet_rating, puzzle_rating, puzzle_rush_score, last_updated)
+		VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+		''', [(discord_id, provider, *ratings, now) for discord_id, ratings in entries])
+		version = bump_data_version(cursor)
+		conn.commit()
+		conn.close()
+		notify_listeners("accounts", version)
+		return True
+	except Exception as e:
+		logger.error(f"Error storing {provider} ratings: {e}")
+		return False
+
+def get_stale_users(before):
+	"""Get registered users whose latest ratings are older than before (a datetime), or missing"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute('''
+	SELECT u.discord_id, u.chess_username
+	FROM users u
+	LEFT JOIN ratings r ON r.discord_id = u.discord_id
+	GROUP BY u.discord_id
+	HAVING MAX(r.last_updated) IS NULL OR MAX(r.last_updated) < ?
+	''', (before.isoformat(),))
+	results = cursor.fetchall()
+	conn.close()
+	return results
+
+def add_listener(callback):
+	"""Call callback(event, version, **data) after every committed write"""
+	_listeners.append(callback)
+
+def notify_listeners(event, version, **data):
+	"""Tell in-memory indexes about a write that was just committed"""
+	for callback in _listeners:
+		try:
+			callback(event, version, **data)
+		except Exception as e:
+			logger.error(f"Error in {event} listener: {e}")
+
+def bump_data_version(cursor):
+	"""Bump the data version in the caller's transaction to invalidate cached leaderboards"""
+	cursor.execute('''
+	INSERT INTO meta (key, value) VALUES ('data_version', 1)
+	ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+	''')
+	cursor.execute("SELECT value FROM meta WHERE key = 'data_version'")
+	return int(cursor.fetchone()[0])
+
+def get_data_version():
+	"""Get the current data version"""
+	return int(get_meta("data_version", 0))
+
+def get_meta(key, default=None):
+	"""Get a value from the meta table"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("SELECT value FROM meta WHERE key = ?", (key,))
+	result = cursor.fetchone()
+	conn.close()
+	return result[0] if result else default
+
+def set_meta(key, value):
+	"""Set a value in the meta table"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+	conn.commit()
+	conn.close()
+
+def start_refresh_run(source):
+	"""Record the start of a refresh run and return its id"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("INSERT INTO refresh_runs (source, started_at) VALUES (?, ?)",
+			  	(source, datetime.datetime.now().isoformat()))
+	run_id = cursor.lastrowid
+	conn.commit()
+	conn.close()
+	return run_id
+
+def finish_refresh_run(run_id, updated_count, total_count, digest=None):
+	"""Mark a refresh run as finished, with its rating-change digest as JSON"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute('''
+	UPDATE refresh_runs
+	SET finished_at = ?, updated_count = ?, total_count = ?, digest = ?
+	WHERE id = ?
+	''', (datetime.datetime.now().isoformat(), updated_count, total_count, digest, run_id))
+	conn.commit()
+	conn.close()
+
+def get_refresh_digests(after_run_id):
+	"""Get (run_id, digest) of the finished refresh runs after a run id, oldest first"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute('''
+	SELECT id, digest FROM refresh_runs
+	WHERE finished_at IS NOT NULL AND id > ?
+	ORDER BY id
+	''', (after_run_id,))
+	results = cursor.fetchall()
+	conn.close()
+	return results
+
+def count_unfinished_refresh_runs(started_after):
+	"""Count refresh runs started after a datetime that haven't finished yet"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("SELECT COUNT(*) FROM refresh_runs WHERE finished_at IS NULL AND started_at > ?",
+				(started_after.isoformat(),))
+	result = cursor.fetchone()
+	conn.close()
+	return result[0]
+
+def update_personal_bests(entries):
+	"""Record (discord_id, category, rating) entries that beat the stored personal bests
+
+	Returns (discord_id, category, previous_best, rating) for every best that
+	was beaten. A player's first rating in a category is stored as their best
+	without being reported.
+	"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute("SELECT discord_id, category, rating FROM personal_bests")
+	bests = {(discord_id, category): rating for discord_id, category, rating in cursor.fetchall()}
+	now = datetime.datetime.now().isoformat()
+	updates = []
+	beaten = []
+	for discord_id, category, rating in entries:
+		previous = bests.get((discord_id, category))
+		if previous is None or rating > previous:
+			updates.append((discord_id, category, rating, now))
+			if previous is not None:
+				beaten.append((discord_id, category, previous, rating))
+	cursor.executemany('''
+	INSERT OR REPLACE INTO personal_bests (discord_id, category, rating, achieved_at)
+	VALUES (?, ?, ?, ?)
+	''', updates)
+	conn.commit()
+	conn.close()
+	return beaten
+
+def get_latest_refresh_run():
+	"""Get the most recent finished refresh run"""
+	conn = get_connection()
+	cursor = conn.cursor()
+	cursor.execute('''
+	SELECT id, source, started_at, finished_at, updated_count, total_count
+	FROM refresh_runs
+	WHERE finished_at IS NOT NULL
+	ORDER BY id DESC LIMIT 1
+	''')
+	result = cursor.fetchone()
+	conn.close()
+	return result
@@ -0,0 +1,99 @@
+# digest.py - Rating changes of a refresh run: biggest movers, personal bests and rank changes
+import config
+from database import get_latest_ratings, update_personal_bests
+from ranking import category_scores
+
+RATING_CATEGORIES = ("rapid", "blitz", "bullet", "puzzle", "puzzle_rush")
+
+def snapshot_ratings():
+	"""{discord_id: (chess_username, rapid, blitz, bullet, puzzle, puzzle_rush)} of every player, in one query"""
+	return {row[0]: row[1:] for row in get_latest_ratings()}
+
+def _overall_ranks(players):
+	"""{discord_id: rank} on the overall leaderboard, ordered like the ranking engine"""
+	keys = sorted(((category_scores(player[1:])["overall"], discord_id) for discord_id, player in players.items()),
+				reverse=True)
+	return {discord_id: rank for rank, (_, discord_id) in enumerate(keys, start=1)}
+
+def build_digest(before, after, refreshed, limit=config.DIGEST_SIZE):
+	"""Compare snapshots taken before and after a refresh of the refreshed discord_ids
+
+	Works only on the two snapshots, nothing is fetched again. Personal bests
+	of the refreshed players are updated as a side effect. Only refreshed
+	players are reported, rank changes included, so the digests of worker
+	partitions don't overlap and can be merged with merge_digests. The result
+	is JSON-serializable so workers can store it with their run.
+	"""
+	changes = []
+	entries = []
+	for discord_id in refreshed:
+		new = after.get(discord_id)
+		if new is None:
+			continue
+		old = before.get(discord_id)
+		for index, category in enumerate(RATING_CATEGORIES, start=1):
+			if new[index] is None:
+				continue
+			entries.append((discord_id, category, new[index]))
+			if old is not None and old[index] is not None and new[index] != old[index]:
+				changes.append({"discord_id": discord_id, "username": new[0], "category": category,
+								"old": old[index], "new": new[index], "delta": new[index] - old[index]})
+
+	personal_bests = [{"discord_id": discord_id, "username": after[discord_id][0], "category": category,
+					"old": previous, "new": rating}
+					for discord_id, category, previous, rating in update_personal_bests(entries)]
+	personal_bests.sort(key=lambda best: best["new"] - best["old"], reverse=True)
+
+	old_ranks = _overall_ranks(before)
+	new_ranks = _overall_ranks(after)
+	rank_changes = [{"discord_id": discord_id, "username": after[discord_id][0],
+					"old": old_ranks[discord_id], "new": new_ranks[discord_id]}
+					for discord_id in set(refreshed)
+					if discord_id in old_ranks and discord_id in new_ranks
+					and old_ranks[discord_id] != new_ranks[discord_id]]
+	rank_changes.sort(key=lambda change: abs(change["old"] - change["new"]), reverse=True)
+
+	return {
+		"players": len(refreshed),
+		"changed": len({change["discord_id"] for change in changes}),
+		"gains": sorted((change for change in changes if change["delta"] > 0),
+						key=lambda change: change["delta"], reverse=True)[:limit],
+		"losses": sorted((change for change in changes if change["delta"] < 0),
+						key=lambda change: change["delta"])[:limit],
+		"personal_bests": personal_bests[:limit],
+		"rank_changes": rank_changes[:limit],
+	}
+
+def merge_digests(digests, current=None, limit=config.DIGEST_SIZE):
+	"""Combine digests posted together, like those of the partitions of one worker cycle
+
+	A player's rank change runs from their first old rank to their last new
+	one, in case several cycles are posted at once. Given current, a
+	snapshot_ratings() taken after every partition finished, new ranks are
+	read from it, as a partition's own snapshot misses the later partitions.
+	"""
+	gains, losses, personal_bests = [], [], []
+	rank_changes = {}
+	players = changed = 0
+	for digest in digests:
+		players += digest["players"]
+		changed += digest["changed"]
+		gains += digest["gains"]
+		losses += digest["losses"]
+		personal_bests += digest["personal_bests"]
+		for change in digest["rank_changes"]:
+			previous = rank_changes.get(change["discord_id"])
+			rank_changes[change["discord_id"]] = dict(change, old=previous["old"]) if previous else change
+	if current is not None:
+		ranks = _overall_ranks(current)
+		rank_changes = {discord_id: dict(change, new=ranks[discord_id])
+						for discord_id, change in rank_changes.items() if discord_id in ranks}
+	return {
+		"players": players,
+		"changed": changed,
+		"gains": sorted(gains, key=lambda change: change["delta"], reverse=True)[:limit],
+		"losses": sorted(losses, key=lambda change: change["delta"])[:limit],
+		"personal_bests": sorted(personal_bests, key=lambda best: best["new"] - best["old"], reverse=True)[:limit],
+		"rank_changes": sorted((change for change in rank_changes.values() if change["old"] != change["new"]),
+							key=lambda change: abs(change["old"] - change["new"]), reverse=True)[:limit],
+	}
@@ -0,0 +1,100 @@
+# export.py - Streaming CSV/NDJSON export of leaderboards and the ratings table
+import csv
+import gzip
+import io
+import itertools
+import json
+import logging
+import os
+import tempfile
+from database import iter_leaderboard, iter_ratings
+
+logger = logging.getLogger('chess_bot.export')
+
+RATINGS_COLUMNS = ["discord_id", "chess_username", "rapid_rating", "blitz_rating", "bullet_rating",
+				"puzzle_rating", "puzzle_rush_score", "last_updated"]
+
+# Room left for data gzip still holds in its buffers when a part is checked
+GZIP_MARGIN = 256 * 1024
+
+def export_rows(table):
+	"""(columns, row generator) for a leaderboard category or the "ratings" table"""
+	if table == "ratings":
+		return RATINGS_COLUMNS, iter_ratings()
+	if table == "overall":
+		columns = ["rank", "discord_id", "chess_username", "rapid", "blitz", "bullet", "average"]
+	else:
+		columns = ["rank", "discord_id", "chess_username", table]
+	rows = ((rank, *row) for rank, row in enumerate(iter_leaderboard(table), start=1))
+	return columns, rows
+
+def iter_csv(columns, rows):
+	"""Yield encoded CSV lines, the first being the header"""
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+	for values in itertools.chain([columns], rows):
+		writer.writerow(values)
+		yield buffer.getvalue().encode()
+		buffer.seek(0)
+		buffer.truncate()
+
+def iter_ndjson(columns, rows):
+	"""Yield encoded JSON lines, one object per row"""
+	for row in rows:
+		yield (json.dumps(dict(zip(columns, row))) + "\n").encode()
+
+class _Part:
+	"""One output file, optionally gzip-compressed"""
+
+	def __init__(self, compress):
+		fd, self.path = tempfile.mkstemp(prefix="export-")
+		self.raw = os.fdopen(fd, "wb")
+		self.out = gzip.GzipFile(fileobj=self.raw, mode="wb") if compress else self.raw
+		self.compress = compress
+		self.rows = 0
+
+	def size_after(self, chunk):
+		if self.compress:
+			return self.raw.tell() + GZIP_MARGIN
+		return self.raw.tell() + len(chunk)
+
+	def close(self):
+		if self.compress:
+			self.out.close()
+		self.raw.close()
+
+def write_export(table, fmt, compress, size_limit):
+	"""Stream an export into temporary files, each smaller than size_limit
+
+	CSV parts repeat the header. Returns the paths of the parts, which the
+	caller must delete.
+	"""
+	columns, rows = export_rows(table)
+	lines = iter_csv(columns, rows) if fmt == "csv" else iter_ndjson(columns, rows)
+	header = next(lines) if fmt == "csv" else b""
+
+	parts = []
+	part = None
+	try:
+		for line in lines:
+			if part is None or (part.rows and part.size_after(line) > size_limit):
+				if part is not None:
+					part.close()
+				part = _Part(compress)
+				parts.append(part)
+				part.out.write(header)
+			part.out.write(line)
+			part.rows += 1
+		if part is None:
+			# Empty export, still send the header
+			part = _Part(compress)
+			parts.append(part)
+			part.out.write(header)
+		part.close()
+	except Exception:
+		for part in parts:
+			part.close()
+			os.remove(part.path)
+		raise
+	logger.info(f"Exported {table} as {fmt} in {len(parts)} part(s)")
+	return [part.path for part in parts]
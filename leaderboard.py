@@ -0,0 +1,235 @@
+# leaderboard.py - Leaderboard page cursor and embed rendering
+import discord
+import datetime
+from ranking import engine
+from teams import team_rankings
+from tracing import span, traced
+from pagination import Pagination
+
+PAGE_SIZE = 25
+
+class LeaderboardCursor:
+	"""Page position in a leaderboard, holding only the rows currently shown"""
+
+	def __init__(self, category, per_page=PAGE_SIZE):
+		self.category = category
+		self.per_page = per_page
+		self.page = 1
+		self.rows = []
+		# discord_id of the player whose row is marked, for around_me
+		self.highlight = None
+
+	def total_pages(self):
+		return Pagination.compute_total_pages(engine.count(self.category), self.per_page)
+
+	def go_to(self, page):
+		with span("rank_lookup"):
+			self.page = min(max(page, 1), max(self.total_pages(), 1))
+			self.rows = engine.page(self.category, self.page, self.per_page)
+
+	def go_to_rank(self, rank):
+		"""Move to the page containing a rank"""
+		self.go_to((rank - 1) // self.per_page + 1)
+
+	def first(self):
+		self.go_to(1)
+
+	def last(self):
+		self.go_to(self.total_pages())
+
+	def next(self):
+		self.go_to(self.page + 1)
+
+	def previous(self):
+		self.go_to(self.page - 1)
+
+	def ranked_rows(self):
+		"""Rows of the current page with their leaderboard position"""
+		return self.rows
+
+	def board(self):
+		"""Key of the leaderboard in persistent button ids"""
+		return self.category
+
+	def data_version(self):
+		"""Version of the rankings the page was read from"""
+		return engine.version or 0
+
+	async def render(self):
+		return await get_page(self)
+
+class TeamLeaderboardCursor(LeaderboardCursor):
+	"""Page position in the team leaderboard of one category and metric"""
+
+	def __init__(self, category, metric, per_page=PAGE_SIZE):
+		super().__init__(category, per_page)
+		self.metric = metric
+
+	def total_pages(self):
+		return Pagination.compute_total_pages(team_rankings.count(self.category, self.metric), self.per_page)
+
+	def go_to(self, page):
+		with span("rank_lookup"):
+			self.page = min(max(page, 1), max(self.total_pages(), 1))
+			self.rows = team_rankings.page(self.category, self.metric, self.page, self.per_page)
+
+	def board(self):
+		return f"team.{self.category}.{self.metric}"
+
+	def data_version(self):
+		return team_rankings.version or 0
+
+	async def render(self):
+		return await get_team_page(self)
+
+def cursor_for_board(board):
+	"""The cursor of a leaderboard key made by board()"""
+	if board.startswith("team."):
+		_, category, metric = board.split(".")
+		return TeamLeaderboardCursor(category, metric)
+	return LeaderboardCursor(board)
+
+def build_leaderboard_embed(category, ranked_rows, highlight=None):
+	"""Create the embed for one leaderboard page"""
+	def marker(discord_id):
+		return "➡️ " if discord_id == highlight else ""
+
+	if category == "puzzle_rush":
+		emb = discord.Embed(
+			title="Chess.com Puzzle Rush Leaderboard",
+			description="Top puzzle rush survival scores",
+			color=0x00BFFF,
+			timestamp=datetime.datetime.now()
+		)
+		for index, (discord_id, chess_username, score) in ranked_rows:
+			emb.add_field(
+				name=f"{marker(discord_id)}{index}. {chess_username}",
+				value=f"Score: **{score}**",
+				inline=False
+			)
+	elif category == "overall":
+		emb = discord.Embed(
+			title="Chess.com Overall Leaderboard",
+			description="Top Overall scores",
+			color=0x00BFFF,
+			timestamp=datetime.datetime.now()
+		)
+		for index, (discord_id, chess_username, rapid, blitz, bullet, avg_rating) in ranked_rows:
+			emb.add_field(
+				name=f"{marker(discord_id)}{index}. {chess_username}",
+				value=f"Average: **{int(avg_rating)}**\n"
+					f"Rapid: {rapid or 'N/A'} | Blitz: {blitz or 'N/A'} | "
+					f"Bullet: {bullet or 'N/A'}",
+				inline=False
+			)
+	else:
+		emb = discord.Embed(
+			title=f"Chess.com {category.capitalize()} Ratings Leaderboard",
+			description=f"Top {category.capitalize()} scores",
+			color=0x00BFFF,
+			timestamp=datetime.datetime.now()
+		)
+		for index, (discord_id, chess_username, rating) in ranked_rows:
+			emb.add_field(
+				name=f"{marker(discord_id)}{index}. {chess_username}",
+				value=f"Rating: **{rating}**",
+				inline=False
+			)
+	emb.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/5987/5987898.png")
+	return emb
+
+async def get_page(cursor):
+	"""Render the cursor's current page for Pagination"""
+	with span("render"):
+		emb = build_leaderboard_embed(cursor.category, cursor.ranked_rows(), cursor.highlight)
+	return emb, cursor.total_pages()
+
+TEAM_CATEGORY_NAMES = {"rapid": "Rapid", "blitz": "Blitz", "bullet": "Bullet", "puzzle": "Puzzle",
+					"puzzle_rush": "Puzzle Rush", "overall": "Overall"}
+TEAM_METRIC_NAMES = {"average": "Average", "median": "Median", "top_sum": "Top {top_n} sum"}
+
+def build_team_leaderboard_embed(category, metric, ranked_rows):
+	"""Create the embed for one team leaderboard page"""
+	metric_name = TEAM_METRIC_NAMES[metric].format(top_n=team_rankings.top_n)
+	emb = discord.Embed(
+		title=f"Team {TEAM_CATEGORY_NAMES[category]} Leaderboard",
+		description=f"Teams ranked by {metric_name.lower()}" if ranked_rows else "No team has rated members yet",
+		color=0x00BFFF,
+		timestamp=datetime.datetime.now()
+	)
+	for index, name, value, members in ranked_rows:
+		emb.add_field(
+			name=f"{index}. {name}",
+			value=f"{metric_name}: **{int(value)}** | Rated members: {members}",
+			inline=False
+		)
+	emb.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/5987/5987898.png")
+	return emb
+
+async def get_team_page(cursor):
+	"""Render a TeamLeaderboardCursor's current page for Pagination"""
+	with span("render"):
+		emb = build_team_leaderboard_embed(cursor.category, cursor.metric, cursor.ranked_rows())
+	return emb, cursor.total_pages()
+
+# Persistent leaderboards keep no view in memory: the page to show is encoded
+# in each button's custom_id as lb:board:page:version:author_id:highlight:slot, board
+# being a category or team.<category>.<metric>
+BUTTON_PREFIX = "lb"
+
+def build_persistent_view(cursor, author_id, total_pages):
+	"""Buttons for a persistent leaderboard message"""
+	version = cursor.data_version()
+	highlight = 1 if cursor.highlight else 0
+	def custom_id(page, slot):
+		return f"{BUTTON_PREFIX}:{cursor.board()}:{page}:{version}:{author_id}:{highlight}:{slot}"
+
+	end_page, end_emoji = (1, "⏮️") if cursor.page > total_pages // 2 else (total_pages, "⏭️")
+	view = discord.ui.View(timeout=None)
+	view.add_item(discord.ui.Button(emoji="◀️", style=discord.ButtonStyle.blurple,
+								 	custom_id=custom_id(cursor.page - 1, "prev"), disabled=cursor.page == 1))
+	view.add_item(discord.ui.Button(emoji="▶️", style=discord.ButtonStyle.blurple,
+								 	custom_id=custom_id(cursor.page + 1, "next"), disabled=cursor.page == total_pages))
+	view.add_item(discord.ui.Button(emoji=end_emoji, style=discord.ButtonStyle.blurple,
+								 	custom_id=custom_id(end_page, "end")))
+	# Only the components are needed, don't keep the view in the client's view store
+	view.stop()
+	return view
+
+async def send_persistent_leaderboard(interaction, cursor):
+	"""Send the cursor's page with stateless buttons"""
+	emb, total_pages = await cursor.render()
+	with span("followup_send"):
+		if total_pages <= 1:
+			await interaction.followup.send(embed=emb)
+		else:
+			await interaction.followup.send(embed=emb, view=build_persistent_view(cursor, interaction.user.id, total_pages))
+
+@traced
+async def leaderboard_button(interaction):
+	"""Render the page a persistent leaderboard button points to"""
+	_, board, page, version, author_id, highlight, _ = interaction.data["custom_id"].split(":")
+	if interaction.user.id != int(author_id):
+		emb = discord.Embed(
+			description="Only the author of the command can perform this action.",
+			color=16711680
+		)
+		await interaction.response.send_message(embed=emb, ephemeral=True)
+		return
+
+	cursor = cursor_for_board(board)
+	if highlight == "1":
+		cursor.highlight = interaction.user.id
+	cursor.go_to(int(page))
+	emb, total_pages = await cursor.render()
+	if int(version) != cursor.data_version():
+		emb.set_footer(text="Rankings have changed since this leaderboard was posted")
+	with span("followup_send"):
+		await interaction.response.edit_message(embed=emb, view=build_persistent_view(cursor, author_id, total_pages))
+
+async def handle_component(interaction):
+	"""Route component interactions belonging to persistent leaderboards"""
+	if interaction.type != discord.InteractionType.component:
+		return
+	if interaction.data.get("custom_id", "").startswith(f"{BUTTON_PREFIX}:"):
+		await leaderboard_button(interaction)
@@ -0,0 +1,117 @@
+# logging_setup.py - Queue-based logging shared by the bot, worker and CLI tools
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import time
+import config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else came from extra= and is a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+	"""One JSON object per record, including the fields passed with extra="""
+
+	def format(self, record):
+		entry = {
+			"time": self.formatTime(record),
+			"level": record.levelname,
+			"logger": record.name,
+			"message": record.getMessage(),
+		}
+		entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+		if record.exc_info:
+			entry["exception"] = self.formatException(record.exc_info)
+		return json.dumps(entry, default=str)
+
+class SampleFilter(logging.Filter):
+	"""Rate-limit records logged with extra={"sample": key} to one per interval for each key
+
+	The record that gets through carries the number of records dropped since
+	the previous one as its "sampled_out" field, also appended to its message.
+	"""
+
+	def __init__(self, interval):
+		super().__init__()
+		self.interval = interval
+		self._last = {}
+		self._dropped = {}
+
+	def filter(self, record):
+		key = getattr(record, "sample", None)
+		if key is None:
+			return True
+		now = time.monotonic()
+		if now - self._last.get(key, float("-inf")) < self.interval:
+			self._dropped[key] = self._dropped.get(key, 0) + 1
+			return False
+		self._last[key] = now
+		record.sampled_out = self._dropped.pop(key, 0)
+		if record.sampled_out:
+			record.msg = f"{record.msg} (+{record.sampled_out} similar)"
+		return True
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+	"""QueueHandler that leaves formatting to the listener
+
+	The stock prepare formats the whole record, traceback included, on the
+	logging thread and drops exc_info, which hides it from JsonFormatter.
+	Only the message arguments are merged here, so later changes to mutable
+	arguments can't alter the record.
+	"""
+
+	def prepare(self, record):
+		record = copy.copy(record)
+		record.msg = record.getMessage()
+		record.args = None
+		return record
+
+def _parse_levels(value):
+	"""Parse "logger=LEVEL,logger=LEVEL" into a dict"""
+	if isinstance(value, dict):
+		return value
+	levels = {}
+	for item in value.split(","):
+		if "=" in item:
+			name, level = item.split("=", 1)
+			levels[name.strip()] = level.strip().upper()
+	return levels
+
+def setup_logging():
+	"""Route all logging through a queue drained by a background listener thread
+
+	The calling thread (the event loop) only merges the message arguments and
+	puts the record on a queue; formatting, tracebacks included, and writing
+	happen in the listener. Safe to call more than once.
+	"""
+	global _listener
+	if _listener is not None:
+		return
+
+	handler = logging.StreamHandler()
+	if config.LOG_FORMAT == "json":
+		handler.setFormatter(JsonFormatter())
+	else:
+		handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+	log_queue = queue.SimpleQueue()
+	queue_handler = RecordQueueHandler(log_queue)
+	queue_handler.addFilter(SampleFilter(config.LOG_SAMPLE_SECONDS))
+
+	root = logging.getLogger()
+	for existing in root.handlers[:]:
+		root.removeHandler(existing)
+	root.addHandler(queue_handler)
+	root.setLevel(config.LOG_LEVEL.upper())
+	for name, level in _parse_levels(config.LOG_LEVELS).items():
+		logging.getLogger(name).setLevel(level)
+
+	_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+	_listener.start()
+	atexit.register(_listener.stop)
@@ -1,9 +1,11 @@
 # main.py - Main entry point for the bot
+import startup  # first, so the import phase covers every other module
 import token_bot
 from dotenv import load_dotenv
 from bot import setup_bot
 from database import setup_database
-from tasks import register_tasks  # Changed from start_tasks
+from tasks import register_tasks, top_role_ids  # Changed from start_tasks
+from snapshot import load_snapshot, save_snapshot
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,14 +14,26 @@ if __name__ == "__main__":
 	# Load environment variables
 	load_dotenv()
 	
+	startup.mark("import")
+	
 	# Setup database
 	setup_database()
+	startup.mark("database")
+	
+	# Warm start from the last snapshot if the database has not changed since
+	top_role_ids.update(load_snapshot() or {})
+	startup.mark("snapshot")
 	
 	# Setup bot
 	bot = setup_bot()
 	
 	# Register tasks (but don't start them yet)
 	register_tasks(bot)
+	startup.mark("setup")
 	
 	# Run the bot
-	bot.run(token_bot.BOT_TOKEN)
+	# log_handler=None leaves discord.py's records to the queue-based pipeline
+	bot.run(token_bot.BOT_TOKEN, log_handler=None)
+	
+	# bot.run returns on a graceful shutdown, keep the state for the next start
+	save_snapshot(top_role_ids)
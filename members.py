@@ -0,0 +1,36 @@
+# members.py - On-demand member resolution for lean intents mode
+import asyncio
+import logging
+
+logger = logging.getLogger('chess_bot.members')
+
+# Most user ids a single gateway member request accepts
+QUERY_CHUNK_SIZE = 100
+
+async def resolve_members(guild, discord_ids):
+	"""Map discord_id to Member for the ids that are in the guild
+
+	Members already cached are used as is; the rest are requested over the
+	gateway in chunks of 100 and cached, instead of one HTTP fetch_member
+	per user.
+	"""
+	members = {}
+	missing = []
+	for discord_id in discord_ids:
+		member = guild.get_member(discord_id)
+		if member is None:
+			missing.append(discord_id)
+		else:
+			members[discord_id] = member
+	for start in range(0, len(missing), QUERY_CHUNK_SIZE):
+		chunk = missing[start:start + QUERY_CHUNK_SIZE]
+		try:
+			found = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True)
+		except asyncio.TimeoutError:
+			logger.warning(f"Timed out resolving {len(chunk)} member(s) of {guild.name}")
+			continue
+		members.update((member.id, member) for member in found)
+	if missing:
+		logger.info(f"Resolved {len(members)} of {len(discord_ids)} member(s), "
+					f"{len(missing)} requested from the gateway")
+	return members
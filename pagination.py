@@ -1,16 +1,16 @@
 import discord
 from typing import Callable, Optional
+from tracing import span
 
 
 class Pagination(discord.ui.View):
-    def __init__(self, interaction: discord.Interaction, get_page: Callable,users,category_value=None):
+    def __init__(self, interaction: discord.Interaction, get_page: Callable, cursor):
         self.interaction = interaction
         self.get_page = get_page
-        self.users = users
+        # The cursor holds the current page only, never the whole leaderboard
+        self.cursor = cursor
         self.total_pages: Optional[int] = None
-        self.index = 1
         self.msg = None
-        self.category_value = category_value
         super().__init__(timeout=100)
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
@@ -25,51 +25,46 @@ class Pagination(discord.ui.View):
             return False
 
     async def navegate(self):
-        if self.category_value != None:
-            emb, self.total_pages = await self.get_page(self.index,self.users,self.category_value)
-        else:
-            emb, self.total_pages = await self.get_page(self.index,self.users)
-        if self.total_pages == 1:
-            self.msg = await self.interaction.followup.send(embed=emb)
-        elif self.total_pages > 1:
-            self.update_buttons()
-            self.msg = await self.interaction.followup.send(embed=emb, view=self)
+        emb, self.total_pages = await self.get_page(self.cursor)
+        with span("followup_send"):
+            if self.total_pages <= 1:
+                self.msg = await self.interaction.followup.send(embed=emb)
+            else:
+                self.update_buttons()
+                self.msg = await self.interaction.followup.send(embed=emb, view=self)
 
     async def edit_page(self, interaction: discord.Interaction):
-        if self.category_value != None:
-            emb, self.total_pages = await self.get_page(self.index,self.users,self.category_value)
-        else:
-            emb, self.total_pages = await self.get_page(self.index,self.users)
+        emb, self.total_pages = await self.get_page(self.cursor)
         self.update_buttons()
         await self.msg.edit(embed=emb, view=self)
 
     def update_buttons(self):
-        if self.index > self.total_pages // 2:
+        if self.cursor.page > self.total_pages // 2:
             self.children[2].emoji = "⏮️"
         else:
             self.children[2].emoji = "⏭️"
-        self.children[0].disabled = self.index == 1
-        self.children[1].disabled = self.index == self.total_pages
+        self.children[0].disabled = self.cursor.page == 1
+        self.children[1].disabled = self.cursor.page == self.total_pages
 
     @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.blurple)
     async def previous(self, interaction: discord.Interaction, button: discord.Button):
         await interaction.response.defer()
-        self.index -= 1
+        self.cursor.previous()
         await self.edit_page(interaction)
 
     @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.blurple)
     async def next(self, interaction: discord.Interaction, button: discord.Button):
         await interaction.response.defer()
-        self.index += 1
+        self.cursor.next()
         await self.edit_page(interaction)
 
     @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.blurple)
     async def end(self, interaction: discord.Interaction, button: discord.Button):
         await interaction.response.defer()
-        if self.index <= self.total_pages//2:
-            self.index = self.total_pages
+        if self.cursor.page <= self.total_pages//2:
+            self.cursor.last()
         else:
-            self.index = 1
+            self.cursor.first()
         await self.edit_page(interaction)
 
     async def on_timeout(self):
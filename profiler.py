@@ -0,0 +1,136 @@
+# profiler.py - On-demand sampling CPU profiler and tracemalloc report for /admin_profile
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+import config
+
+logger = logging.getLogger('chess_bot.profiler')
+
+_running = False
+
+class SamplingProfiler:
+	"""Sample the stack of one thread from a side thread at a fixed interval
+
+	Nothing runs when it is not started; while running, the cost is one
+	sys._current_frames() call per interval and no tracing hooks.
+	"""
+
+	def __init__(self, thread_id, interval):
+		self.thread_id = thread_id
+		self.interval = interval
+		self.samples = 0
+		self.idle = 0
+		# (filename, first line, function) -> samples where it was innermost / anywhere on the stack
+		self.own = Counter()
+		self.cumulative = Counter()
+		self._stop = threading.Event()
+		self._thread = None
+
+	def start(self):
+		self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		self._stop.set()
+		self._thread.join()
+
+	def _run(self):
+		while not self._stop.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			if frame is None:
+				continue
+			self.samples += 1
+			# The loop waiting in the selector is idle, not busy
+			if frame.f_code.co_filename.endswith("selectors.py"):
+				self.idle += 1
+				continue
+			stack = []
+			while frame is not None:
+				code = frame.f_code
+				stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+				frame = frame.f_back
+			self.own[stack[0]] += 1
+			self.cumulative.update(set(stack))
+
+	def report(self, duration, limit):
+		busy = self.samples - self.idle
+		lines = [f"CPU: {self.samples} samples of the event loop thread over {duration:.0f}s, "
+				f"busy in {busy} ({busy / max(self.samples, 1):.0%})", ""]
+		for title, counter in (("Top functions (own samples)", self.own),
+							("Top functions (including callees)", self.cumulative)):
+			lines.append(title)
+			lines.append(f"{'samples':>8} {'busy %':>7}  function")
+			for (filename, lineno, function), count in counter.most_common(limit):
+				lines.append(f"{count:>8} {count / max(busy, 1):>7.1%}  {function} ({_short(filename)}:{lineno})")
+			lines.append("")
+		return lines
+
+def _short(filename):
+	"""Path relative to the bot's directory for our files, else the last two components"""
+	project = os.path.dirname(os.path.abspath(__file__))
+	if filename.startswith(project):
+		return os.path.relpath(filename, project)
+	return os.path.join(*filename.split(os.sep)[-2:]) if os.sep in filename else filename
+
+def _memory_report(baseline, snapshot, duration, limit):
+	lines = [f"Memory: traced allocations over {duration:.0f}s", "", "Top allocation sites at the end"]
+	lines.append(f"{'size KiB':>10} {'blocks':>8}  site")
+	for stat in snapshot.statistics("lineno")[:limit]:
+		frame = stat.traceback[0]
+		lines.append(f"{stat.size / 1024:>10.1f} {stat.count:>8}  {_short(frame.filename)}:{frame.lineno}")
+	lines += ["", "Growth since the start of the window"]
+	lines.append(f"{'KiB diff':>10} {'blocks':>8}  site")
+	for stat in snapshot.compare_to(baseline, "lineno")[:limit]:
+		frame = stat.traceback[0]
+		lines.append(f"{stat.size_diff / 1024:>+10.1f} {stat.count_diff:>+8}  {_short(frame.filename)}:{frame.lineno}")
+	lines.append("")
+	return lines
+
+def _take_snapshot():
+	return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+async def profile(duration, cpu=True, memory=True, limit=25):
+	"""Profile the bot for duration seconds and return a text report
+
+	Raises RuntimeError if another profile is running. tracemalloc is
+	stopped again afterwards unless it was already tracing.
+	"""
+	global _running
+	if _running:
+		raise RuntimeError("A profile is already running")
+	_running = True
+	sampler = None
+	started_tracing = False
+	try:
+		if memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start(config.PROFILE_TRACEMALLOC_FRAMES)
+				started_tracing = True
+			baseline = _take_snapshot()
+		if cpu:
+			sampler = SamplingProfiler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+			sampler.start()
+		logger.info(f"Profiling for {duration}s (cpu={cpu}, memory={memory})")
+		start = time.monotonic()
+		await asyncio.sleep(duration)
+		elapsed = time.monotonic() - start
+
+		lines = []
+		if sampler:
+			sampler.stop()
+			lines += sampler.report(elapsed, limit)
+		if memory:
+			snapshot = _take_snapshot()
+			lines += await asyncio.to_thread(_memory_report, baseline, snapshot, elapsed, limit)
+		return "\n".join(lines)
+	finally:
+		if sampler:
+			sampler.stop()
+		if started_tracing:
+			tracemalloc.stop()
+		_running = False
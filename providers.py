@@ -0,0 +1,152 @@
+# providers.py - Rating providers: fetch player data from a chess site and parse it into our ratings record
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import requests
+import config
+from chess_api import RateLimiter, fetch_chess_data
+from tracing import span
+
+logger = logging.getLogger('chess_bot.providers')
+
+# Usernames Lichess accepts in one bulk request
+LICHESS_MAX_BATCH = 300
+# Lichess asks clients to wait a full minute after a 429
+LICHESS_RETRY_SECONDS = 60
+
+class RatingProvider(ABC):
+	"""A chess site players link accounts on
+
+	fetch gets one player's raw data (None if they don't exist), fetch_many
+	gets several and returns {lowercased username: raw data} for the ones
+	found, and parse turns raw data into (rapid, blitz, bullet, puzzle,
+	puzzle_rush). Providers with batch_size above 1 fetch that many players
+	per request; the default fetch_many makes one request per player.
+	"""
+
+	name = None
+	label = None
+	batch_size = 1
+
+	@abstractmethod
+	def profile_url(self, username):
+		"""Link to a player's page on the site"""
+
+	@abstractmethod
+	async def fetch(self, username):
+		"""One player's raw data, None if they don't exist"""
+
+	async def fetch_many(self, usernames):
+		results = {}
+		for username in usernames:
+			data = await self.fetch(username)
+			if data:
+				results[username.lower()] = data
+		return results
+
+	@abstractmethod
+	def parse(self, data):
+		"""(rapid, blitz, bullet, puzzle, puzzle_rush) from raw data, None where missing"""
+
+class ChessComProvider(RatingProvider):
+	"""Chess.com, one stats request per player through chess_api"""
+
+	name = "chesscom"
+	label = "Chess.com"
+
+	def profile_url(self, username):
+		return f"https://www.chess.com/member/{username}"
+
+	async def fetch(self, username):
+		return await fetch_chess_data(username)
+
+	def parse(self, data):
+		"""Get (rapid, blitz, bullet, puzzle, puzzle_rush) from a stats response, None where missing"""
+		rapid = data.get('chess_rapid', {}).get('last', {}).get('rating', None)
+		blitz = data.get('chess_blitz', {}).get('last', {}).get('rating', None)
+		bullet = data.get('chess_bullet', {}).get('last', {}).get('rating', None)
+		puzzle = data.get('tactics', {}).get('highest', {}).get('rating', None)
+		puzzle_rush = data.get('puzzle_rush', {}).get('best', {}).get('score', None)
+		return (rapid, blitz, bullet, puzzle, puzzle_rush)
+
+class LichessProvider(RatingProvider):
+	"""Lichess, fetching up to 300 players per request from the bulk users endpoint"""
+
+	name = "lichess"
+	label = "Lichess"
+
+	def __init__(self, base_url=config.LICHESS_API_URL, token=config.LICHESS_API_TOKEN,
+				batch_size=config.LICHESS_BATCH_SIZE, min_interval=config.LICHESS_MIN_INTERVAL):
+		self.base_url = base_url.rstrip("/")
+		self.batch_size = max(1, min(batch_size, LICHESS_MAX_BATCH))
+		self.headers = {'User-Agent': 'Discord Chess Leaderboard Bot (your@email.com)'}
+		if token:
+			self.headers['Authorization'] = f"Bearer {token}"
+		# Lichess wants one request at a time
+		self.rate_limiter = RateLimiter(1, min_interval)
+
+	def profile_url(self, username):
+		return f"https://lichess.org/@/{username}"
+
+	async def _request(self, method, path, body=None):
+		"""Send a request in a thread, waiting out rate limits"""
+		while True:
+			async with self.rate_limiter:
+				with span("api_fetch"):
+					response = await asyncio.to_thread(requests.request, method, self.base_url + path,
+													headers=self.headers, data=body, timeout=30)
+			if response.status_code != 429:
+				return response
+			logger.warning(f"Rate limited by Lichess! Waiting {LICHESS_RETRY_SECONDS} seconds")
+			await asyncio.sleep(LICHESS_RETRY_SECONDS)
+
+	async def fetch(self, username):
+		try:
+			response = await self._request("GET", f"/api/user/{username}")
+			if response.status_code == 404:
+				logger.warning(f"User {username} not found on Lichess")
+				return None
+			response.raise_for_status()
+			user = response.json()
+		except (requests.exceptions.RequestException, ValueError) as e:
+			logger.error(f"Lichess request error: {e}")
+			return None
+		# Closed accounts are still returned, flagged as disabled
+		return None if user.get("disabled") else user
+
+	async def fetch_many(self, usernames):
+		results = {}
+		for start in range(0, len(usernames), self.batch_size):
+			chunk = usernames[start:start + self.batch_size]
+			try:
+				response = await self._request("POST", "/api/users", ",".join(chunk))
+				response.raise_for_status()
+				users = response.json()
+			except (requests.exceptions.RequestException, ValueError) as e:
+				logger.error(f"Lichess bulk request error for {len(chunk)} users: {e}")
+				continue
+			# Unknown usernames are left out of the response; ids are lowercased usernames
+			for user in users:
+				if not user.get("disabled"):
+					results[user["id"]] = user
+		return results
+
+	def parse(self, data):
+		"""Map Lichess perfs onto our categories, Puzzle Storm standing in for Puzzle Rush"""
+		perfs = data.get('perfs', {})
+		def rating(perf):
+			stats = perfs.get(perf, {})
+			return stats.get('rating') if stats.get('games') else None
+		storm = perfs.get('storm', {})
+		puzzle_storm = storm.get('score') if storm.get('runs') else None
+		return (rating('rapid'), rating('blitz'), rating('bullet'), rating('puzzle'), puzzle_storm)
+
+# Chess.com accounts are the ones registered in users and ranked on the leaderboards,
+# accounts on the other providers are linked in linked_accounts
+PRIMARY_PROVIDER = "chesscom"
+PROVIDERS = {provider.name: provider for provider in (ChessComProvider(), LichessProvider())}
+primary_provider = PROVIDERS[PRIMARY_PROVIDER]
+
+def linked_providers():
+	"""Providers users link extra accounts on"""
+	return [provider for name, provider in PROVIDERS.items() if name != PRIMARY_PROVIDER]
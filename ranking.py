@@ -0,0 +1,200 @@
+# ranking.py - In-memory ranking engine shared by the leaderboard command and role sync
+import bisect
+import logging
+from array import array
+from database import get_latest_ratings, get_data_version, add_listener
+from tracing import span
+
+logger = logging.getLogger('chess_bot.ranking')
+
+CATEGORIES = ("rapid", "blitz", "bullet", "puzzle", "puzzle_rush", "overall")
+
+def category_scores(ratings):
+	"""Map a (rapid, blitz, bullet, puzzle, puzzle_rush) record to the score of each category"""
+	rapid, blitz, bullet, puzzle, puzzle_rush = ratings
+	played = [r for r in [rapid, blitz, bullet] if r is not None]
+	return {
+		"rapid": rapid,
+		"blitz": blitz,
+		"bullet": bullet,
+		"puzzle": puzzle,
+		"puzzle_rush": puzzle_rush,
+		"overall": sum(played) / len(played) if played else 0,
+	}
+
+class CategoryRanking:
+	"""Players of one category, best first, in two parallel arrays
+
+	Scores and ids are stored negated so both arrays sort ascending and can
+	be searched with bisect; ties on score are broken by the higher discord_id,
+	like iter_leaderboard in database.py.
+	"""
+
+	def __init__(self):
+		self._scores = array('d')
+		self._ids = array('q')
+		self._score_of = {}
+
+	def __len__(self):
+		return len(self._ids)
+
+	def build(self, entries):
+		"""Replace the contents with (discord_id, score) pairs"""
+		keys = sorted((-score, -discord_id) for discord_id, score in entries if score is not None)
+		self._scores = array('d', (key[0] for key in keys))
+		self._ids = array('q', (key[1] for key in keys))
+		self._score_of = {discord_id: score for discord_id, score in entries if score is not None}
+
+	def dump(self):
+		"""The (scores, ids) arrays, for snapshots"""
+		return self._scores, self._ids
+
+	def restore(self, scores, ids):
+		"""Replace the contents with arrays saved by dump"""
+		self._scores = scores
+		self._ids = ids
+		self._score_of = {-discord_id: -score for score, discord_id in zip(scores, ids)}
+
+	def _position(self, discord_id, score):
+		lo = bisect.bisect_left(self._scores, -score)
+		hi = bisect.bisect_right(self._scores, -score, lo)
+		return bisect.bisect_left(self._ids, -discord_id, lo, hi)
+
+	def update(self, discord_id, score):
+		"""Move a player to the position for their new score (None removes them)"""
+		self.remove(discord_id)
+		if score is None:
+			return
+		position = self._position(discord_id, score)
+		self._scores.insert(position, -score)
+		self._ids.insert(position, -discord_id)
+		self._score_of[discord_id] = score
+
+	def remove(self, discord_id):
+		score = self._score_of.pop(discord_id, None)
+		if score is None:
+			return
+		position = self._position(discord_id, score)
+		del self._scores[position]
+		del self._ids[position]
+
+	def ids(self, start, stop):
+		"""discord_ids ranked start+1 to stop"""
+		return [-discord_id for discord_id in self._ids[start:stop]]
+
+	def rank_of(self, discord_id):
+		"""1-based position of a player, or None if they are not ranked"""
+		score = self._score_of.get(discord_id)
+		if score is None:
+			return None
+		return self._position(discord_id, score) + 1
+
+class RankingEngine:
+	"""Rankings for every category, rebuilt only when another process wrote to
+	the database and updated in place for writes made by this one"""
+
+	def __init__(self):
+		self.version = None
+		# discord_id -> (chess_username, rapid, blitz, bullet, puzzle, puzzle_rush)
+		self._players = {}
+		self._rankings = {category: CategoryRanking() for category in CATEGORIES}
+
+	def _fresh(self, category):
+		version = get_data_version()
+		if version != self.version:
+			self.rebuild(version)
+		return self._rankings[category]
+
+	def rebuild(self, version):
+		"""Load every player's latest ratings and rebuild all categories"""
+		with span("db"):
+			self._players = {row[0]: row[1:] for row in get_latest_ratings()}
+		for category, ranking in self._rankings.items():
+			ranking.build([(discord_id, category_scores(player[1:])[category])
+						for discord_id, player in self._players.items()])
+		self.version = version
+		logger.info(f"Rebuilt rankings for {len(self._players)} players at version {version}")
+
+	def dump(self):
+		"""(version, players, {category: (scores, ids)}) for snapshots, None if not built"""
+		if self.version is None:
+			return None
+		return self.version, self._players, {category: ranking.dump() for category, ranking in self._rankings.items()}
+
+	def restore(self, version, players, rankings):
+		"""Adopt state loaded from a snapshot taken at version
+
+		rankings maps each category to its (scores, ids) arrays.
+		"""
+		self._players = players
+		for category, (scores, ids) in rankings.items():
+			self._rankings[category].restore(scores, ids)
+		self.version = version
+		logger.info(f"Restored rankings for {len(self._players)} players at version {version}")
+
+	def on_change(self, event, version, **data):
+		"""database listener keeping the rankings in step with local writes"""
+		if self.version is None or version != self.version + 1:
+			# Missed a write (or never built), rebuild on the next read
+			self.version = None
+			return
+
+		discord_id = data.get("discord_id")
+		if event == "ratings":
+			if discord_id not in self._players:
+				# A first rating, or ratings stored after the player unregistered,
+				# which the users join in SQL leaves out; let a rebuild decide
+				self.version = None
+				return
+			chess_username = self._players[discord_id][0]
+			self._players[discord_id] = (chess_username, *data["ratings"])
+			for category, score in category_scores(data["ratings"]).items():
+				self._rankings[category].update(discord_id, score)
+		elif event == "register":
+			# Players are only ranked once their first ratings are stored
+			ratings = self._players.get(discord_id, (None,) * 6)[1:]
+			self._players[discord_id] = (data["chess_username"], *ratings)
+		elif event == "unregister":
+			self._players.pop(discord_id, None)
+			for ranking in self._rankings.values():
+				ranking.remove(discord_id)
+		self.version = version
+
+	def row(self, category, discord_id):
+		"""Leaderboard row of a player in the shape get_leaderboard_data uses"""
+		chess_username, rapid, blitz, bullet, puzzle, puzzle_rush = self._players[discord_id]
+		score = category_scores(self._players[discord_id][1:])[category]
+		if category == "overall":
+			return (discord_id, chess_username, rapid, blitz, bullet, score)
+		return (discord_id, chess_username, score)
+
+	def count(self, category):
+		return len(self._fresh(category))
+
+	def page(self, category, page, per_page=25):
+		"""(rank, row) pairs of one page"""
+		ranking = self._fresh(category)
+		start = (page - 1) * per_page
+		ids = ranking.ids(start, start + per_page)
+		return [(start + offset + 1, self.row(category, discord_id)) for offset, discord_id in enumerate(ids)]
+
+	def top(self, category, k):
+		"""(rank, row) pairs of the best k players"""
+		return self.page(category, 1, k)
+
+	def rank_of(self, category, discord_id):
+		"""1-based rank of a player in a category, or None if unranked"""
+		return self._fresh(category).rank_of(discord_id)
+
+	def standings(self, discord_id):
+		"""{category: (rank, players)} for each category a player is ranked in"""
+		self._fresh(CATEGORIES[0])
+		standings = {}
+		for category, ranking in self._rankings.items():
+			rank = ranking.rank_of(discord_id)
+			if rank is not None:
+				standings[category] = (rank, len(ranking))
+		return standings
+
+engine = RankingEngine()
+add_listener(engine.on_change)
@@ -0,0 +1,88 @@
+# refresh.py - Rating refresh shared by the bot and the worker process
+import asyncio
+import json
+import logging
+import config
+from database import (get_all_users, store_user_ratings, start_refresh_run, finish_refresh_run,
+					get_linked_accounts, store_provider_ratings)
+from providers import primary_provider, linked_providers
+from digest import snapshot_ratings, build_digest
+
+logger = logging.getLogger('chess_bot.refresh')
+
+async def refresh_users(users, delay=config.REFRESH_REQUEST_DELAY, provider=primary_provider, on_progress=None):
+	"""Fetch and store ratings for the given (discord_id, chess_username) pairs
+
+	provider fetches and parses a user's stats (Chess.com unless replaying
+	fixtures) and on_progress, if given, is called with (done, total,
+	chess_username, status) after each user, status being "updated",
+	"not found" or "error".
+	"""
+	update_count = 0
+	for done, (discord_id, chess_username) in enumerate(users, start=1):
+		# Add delay to avoid rate limiting
+		await asyncio.sleep(delay)
+
+		# Fetch new ratings
+		chess_data = await provider.fetch(chess_username)
+		status = "not found"
+		if chess_data:
+			status = "error"
+			if store_user_ratings(discord_id, provider.parse(chess_data)):
+				update_count += 1
+				status = "updated"
+		if on_progress:
+			on_progress(done, len(users), chess_username, status)
+		logger.debug(f"Refreshed {chess_username}: {update_count} updated so far",
+					extra={"sample": "refresh.user"})
+	return update_count
+
+async def refresh_accounts(provider, accounts, delay=config.REFRESH_REQUEST_DELAY, on_progress=None):
+	"""Fetch and store ratings for (discord_id, username) accounts linked on a provider
+
+	Batch-capable providers fetch batch_size accounts per request and the
+	whole batch is stored in one transaction, so a roster takes a handful of
+	requests; others fetch one account at a time, delay seconds apart.
+	on_progress works as in refresh_users.
+	"""
+	update_count = 0
+	done = 0
+	batch_size = provider.batch_size
+	for start in range(0, len(accounts), batch_size):
+		batch = accounts[start:start + batch_size]
+		if batch_size == 1:
+			await asyncio.sleep(delay)
+		fetched = await provider.fetch_many([username for _, username in batch])
+		entries = [(discord_id, provider.parse(fetched[username.lower()]))
+				for discord_id, username in batch if username.lower() in fetched]
+		stored = store_provider_ratings(provider.name, entries) if entries else True
+		if stored:
+			update_count += len(entries)
+		for discord_id, username in batch:
+			done += 1
+			if on_progress:
+				status = "not found" if username.lower() not in fetched else "updated" if stored else "error"
+				on_progress(done, len(accounts), username, status)
+		logger.debug(f"Refreshed {len(batch)} {provider.label} accounts: {update_count} updated so far",
+					extra={"sample": "refresh.accounts"})
+	return update_count
+
+async def run_refresh(source, partition=0, partitions=1):
+	"""Refresh all registered users (or one partition of them) and record the run"""
+	users = [user for user in get_all_users() if user[0] % partitions == partition]
+	logger.info(f"Starting ratings update for {len(users)} users ({source})...")
+
+	run_id = start_refresh_run(source)
+	before = snapshot_ratings()
+	update_count = await refresh_users(users)
+	digest = build_digest(before, snapshot_ratings(), [discord_id for discord_id, _ in users])
+	finish_refresh_run(run_id, update_count, len(users), json.dumps(digest))
+
+	logger.info(f"Ratings update complete! Updated {update_count}/{len(users)} users.")
+	# Linked accounts on other sites aren't ranked, so they're left out of the run's counts and digest
+	for provider in linked_providers():
+		accounts = [account for account in get_linked_accounts(provider.name) if account[0] % partitions == partition]
+		if accounts:
+			linked_count = await refresh_accounts(provider, accounts)
+			logger.info(f"Updated {linked_count}/{len(accounts)} linked {provider.label} accounts.")
+	return run_id
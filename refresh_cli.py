@@ -0,0 +1,126 @@
+# refresh_cli.py - Refresh ratings from the command line, without connecting to Discord
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+import config
+from database import (setup_database, get_all_users, get_stale_users, start_refresh_run, finish_refresh_run,
+					get_linked_accounts)
+from refresh import refresh_users, refresh_accounts
+from providers import PROVIDERS, ChessComProvider, primary_provider, linked_providers
+from digest import snapshot_ratings, build_digest
+from logging_setup import setup_logging
+
+# Exit codes: every selected user refreshed, some could not be, bad arguments or selection
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+
+def select_users(args):
+	"""(discord_id, username) pairs chosen by the arguments, and the selectors that matched nobody
+
+	Users are Chess.com registrations, or the accounts linked on --provider.
+	"""
+	before = None
+	if args.stale is not None:
+		before = datetime.datetime.now() - datetime.timedelta(minutes=args.stale)
+	if args.provider:
+		users = get_linked_accounts(args.provider, before)
+	elif before is not None:
+		users = get_stale_users(before)
+	else:
+		users = get_all_users()
+	if not args.users:
+		return users, []
+	by_name = {chess_username.casefold(): (discord_id, chess_username) for discord_id, chess_username in users}
+	by_id = {str(discord_id): (discord_id, chess_username) for discord_id, chess_username in users}
+	selected = {}
+	unknown = []
+	for selector in args.users:
+		user = by_id.get(selector) or by_name.get(selector.casefold())
+		if user is None:
+			unknown.append(selector)
+		else:
+			selected[user[0]] = user
+	return list(selected.values()), unknown
+
+class FixtureProvider(ChessComProvider):
+	"""Chess.com provider reading <username>.json stats responses from a directory"""
+
+	def __init__(self, directory):
+		self.directory = directory
+
+	async def fetch(self, username):
+		path = os.path.join(self.directory, f"{username.lower()}.json")
+		try:
+			with open(path) as file:
+				return json.load(file)
+		except FileNotFoundError:
+			return None
+
+def print_progress(done, total, chess_username, status):
+	print(f"[{done:>{len(str(total))}}/{total}] {chess_username}: {status}", file=sys.stderr, flush=True)
+
+async def main(args):
+	setup_database()
+	users, unknown = select_users(args)
+	for selector in unknown:
+		print(f"Not a registered user: {selector}", file=sys.stderr)
+	if args.users and not users:
+		return EXIT_USAGE
+
+	if args.provider:
+		provider = PROVIDERS[args.provider]
+		delay = config.REFRESH_REQUEST_DELAY if args.delay is None else args.delay
+		start = time.perf_counter()
+		update_count = await refresh_accounts(provider, users, delay, None if args.quiet else print_progress)
+		elapsed = time.perf_counter() - start
+		# Linked accounts aren't ranked, so no refresh run or digest is recorded
+		print(f"Updated {update_count}/{len(users)} {provider.label} accounts in {elapsed:.1f}s")
+		return EXIT_FAILURES if update_count < len(users) or unknown else EXIT_OK
+
+	if args.fixtures:
+		provider = FixtureProvider(args.fixtures)
+		delay = 0 if args.delay is None else args.delay
+	else:
+		provider = primary_provider
+		delay = config.REFRESH_REQUEST_DELAY if args.delay is None else args.delay
+
+	start = time.perf_counter()
+	run_id = start_refresh_run("cli")
+	before = snapshot_ratings()
+	update_count = await refresh_users(users, delay, provider, None if args.quiet else print_progress)
+	digest = build_digest(before, snapshot_ratings(), [discord_id for discord_id, _ in users])
+	finish_refresh_run(run_id, update_count, len(users), json.dumps(digest))
+	elapsed = time.perf_counter() - start
+
+	print(f"Updated {update_count}/{len(users)} users in {elapsed:.1f}s (run {run_id})")
+	if update_count < len(users) or unknown:
+		return EXIT_FAILURES
+	return EXIT_OK
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Refresh Chess.com ratings without starting the bot")
+	parser.add_argument("users", nargs="*",
+					 	help="Usernames or Discord ids to refresh (default: every registered user or linked account)")
+	parser.add_argument("--stale", type=float, metavar="MINUTES",
+					 	help="Only refresh users whose ratings are older than this, or missing")
+	parser.add_argument("--fixtures", metavar="DIR",
+					 	help="Replay <username>.json stats responses from DIR instead of calling Chess.com")
+	parser.add_argument("--provider", choices=[provider.name for provider in linked_providers()],
+					 	help="Refresh the accounts linked on this site instead of Chess.com registrations "
+					 		"(bulk-capable sites fetch many accounts per request)")
+	parser.add_argument("--delay", type=float,
+					 	help="Seconds between users (default: REFRESH_REQUEST_DELAY, 0 with --fixtures)")
+	parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+	args = parser.parse_args()
+	if args.fixtures and not os.path.isdir(args.fixtures):
+		parser.error(f"fixtures directory not found: {args.fixtures}")
+	if args.fixtures and args.provider:
+		parser.error("--fixtures replays Chess.com responses, point the provider's API URL at a local server instead")
+
+	setup_logging()
+	sys.exit(asyncio.run(main(args)))
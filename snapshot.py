@@ -0,0 +1,150 @@
+# snapshot.py - Binary snapshot of the in-memory rankings and indexes for warm restarts
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+import config
+from database import get_data_version
+from ranking import engine, CATEGORIES
+from username_index import usernames
+
+logger = logging.getLogger('chess_bot.snapshot')
+
+MAGIC = b"CBSNAP"
+FORMAT_VERSION = 1
+# Magic, format version, native byte order of the arrays, data version, CRC32 of the payload
+HEADER = struct.Struct("<6sH?qI")
+# Stored in place of missing ratings, which are None in memory
+MISSING = -2 ** 63
+
+def _pack_sections(sections):
+	return b"".join(struct.pack("<Q", len(section)) + section for section in sections)
+
+def _unpack_sections(payload):
+	sections = []
+	offset = 0
+	while offset < len(payload):
+		(length,) = struct.unpack_from("<Q", payload, offset)
+		offset += 8
+		sections.append(payload[offset:offset + length])
+		offset += length
+	return sections
+
+def _ids(data):
+	ids = array('q')
+	ids.frombytes(data)
+	return ids
+
+def _scores(data):
+	scores = array('d')
+	scores.frombytes(data)
+	return scores
+
+def _names(data, count):
+	return data.decode().split("\n") if count else []
+
+def encode(state, username_pairs, role_ids):
+	"""Serialize engine.dump(), usernames.dump() and the role ids to bytes"""
+	version, players, rankings = state
+	player_ids = array('q', players)
+	ratings = array('q', (MISSING if rating is None else rating
+						for player in players.values() for rating in player[1:]))
+	sections = [
+		json.dumps({"usernames": username_pairs is not None, "role_ids": role_ids}).encode(),
+		player_ids.tobytes(),
+		ratings.tobytes(),
+		"\n".join(player[0] or "" for player in players.values()).encode(),
+	]
+	for category in CATEGORIES:
+		scores, ids = rankings[category]
+		sections += [scores.tobytes(), ids.tobytes()]
+	username_pairs = username_pairs or []
+	sections += [array('q', (discord_id for discord_id, _ in username_pairs)).tobytes(),
+				"\n".join(chess_username for _, chess_username in username_pairs).encode()]
+	payload = zlib.compress(_pack_sections(sections))
+	return HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == "little", version, zlib.crc32(payload)) + payload
+
+def decode(data):
+	"""Parse a snapshot into (version, players, rankings, username pairs or None, role ids)
+
+	Raises ValueError if the file is not a snapshot this build can read.
+	"""
+	magic, format_version, little_endian, version, checksum = HEADER.unpack_from(data)
+	payload = data[HEADER.size:]
+	if magic != MAGIC or format_version != FORMAT_VERSION:
+		raise ValueError("unknown snapshot format")
+	if little_endian != (sys.byteorder == "little"):
+		raise ValueError("snapshot written on a machine with another byte order")
+	if zlib.crc32(payload) != checksum:
+		raise ValueError("snapshot checksum mismatch")
+	sections = _unpack_sections(zlib.decompress(payload))
+	info = json.loads(sections[0])
+
+	player_ids = _ids(sections[1])
+	ratings = [None if rating == MISSING else rating for rating in _ids(sections[2])]
+	names = _names(sections[3], len(player_ids))
+	players = {discord_id: (names[index] or None, *ratings[index * 5:index * 5 + 5])
+			for index, discord_id in enumerate(player_ids)}
+
+	rankings = {}
+	for offset, category in enumerate(CATEGORIES):
+		rankings[category] = (_scores(sections[4 + offset * 2]), _ids(sections[5 + offset * 2]))
+
+	username_pairs = None
+	if info["usernames"]:
+		index_ids = _ids(sections[-2])
+		username_pairs = list(zip(index_ids, _names(sections[-1], len(index_ids))))
+	return version, players, rankings, username_pairs, info["role_ids"]
+
+def save_snapshot(role_ids, path=config.SNAPSHOT_PATH):
+	"""Write the current state to path, unless the rankings were never built"""
+	state = engine.dump()
+	if state is None:
+		return False
+	temp_path = None
+	try:
+		# The snapshot has one data version, leave out an index that isn't at it
+		index = usernames.dump()
+		data = encode(state, index[1] if index and index[0] == state[0] else None, role_ids)
+		# A temp file of its own per writer, as every shard process saves snapshots
+		descriptor, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".",
+												suffix=".tmp", dir=os.path.dirname(path) or ".")
+		with os.fdopen(descriptor, "wb") as file:
+			file.write(data)
+		os.replace(temp_path, path)
+	except Exception as e:
+		logger.error(f"Failed to write snapshot: {e}")
+		if temp_path is not None and os.path.exists(temp_path):
+			os.remove(temp_path)
+		return False
+	logger.info(f"Wrote snapshot of {len(state[1])} players at version {state[0]} ({len(data)} bytes)")
+	return True
+
+def load_snapshot(path=config.SNAPSHOT_PATH):
+	"""Restore the state saved at path if it matches the database, returning the role ids
+
+	Returns None when there is no usable snapshot; the rankings and index are
+	then built from the database on first use as usual.
+	"""
+	try:
+		with open(path, "rb") as file:
+			data = file.read()
+	except FileNotFoundError:
+		return None
+	try:
+		version, players, rankings, username_pairs, role_ids = decode(data)
+	except Exception as e:
+		logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+		return None
+	current = get_data_version()
+	if version != current:
+		logger.info(f"Ignoring snapshot at version {version}, database is at version {current}")
+		return None
+	engine.restore(version, players, rankings)
+	if username_pairs is not None:
+		usernames.restore(version, username_pairs)
+	return role_ids
@@ -0,0 +1,93 @@
+# stall_watchdog.py - Event-loop stall detection with stack capture from a side thread
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import config
+from tracing import LatencyStats
+
+logger = logging.getLogger('chess_bot.watchdog')
+
+# Frames from files under this directory are reported as the call site
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class StallWatchdog:
+	"""Measure event-loop lag and find out what blocked the loop when it stalls
+
+	A heartbeat task on the loop ticks every interval. A daemon thread checks
+	the heartbeat and, when it is older than the threshold, captures the loop
+	thread's current stack. When the loop wakes up the stall is logged with
+	that stack and aggregated by call site.
+	"""
+
+	def __init__(self, threshold, interval):
+		self.threshold = threshold
+		self.interval = interval
+		self.lag = LatencyStats(config.TRACE_WINDOW)
+		# (filename, lineno, function) -> [stalls, total seconds, longest seconds]
+		self.sites = {}
+		self._beat = time.monotonic()
+		self._stack = None
+		self._lock = threading.Lock()
+		self._loop_thread = None
+		self._task = None
+
+	def start(self):
+		"""Start watching the running loop (call from a coroutine)"""
+		if self._task is not None:
+			return
+		self._loop_thread = threading.get_ident()
+		self._beat = time.monotonic()
+		self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+		threading.Thread(target=self._watch, name="stall-watchdog", daemon=True).start()
+		logger.info(f"Watching the event loop for stalls over {self.threshold * 1000:.0f}ms")
+
+	async def _heartbeat(self):
+		while True:
+			expected = time.monotonic() + self.interval
+			await asyncio.sleep(self.interval)
+			now = time.monotonic()
+			lag = max(now - expected, 0)
+			self.lag.record("event_loop", lag)
+			with self._lock:
+				self._beat = now
+				stack, self._stack = self._stack, None
+			if stack is not None and lag >= self.threshold:
+				self._record(stack, lag)
+
+	def _watch(self):
+		while True:
+			time.sleep(self.interval / 2)
+			with self._lock:
+				if self._stack is not None or time.monotonic() - self._beat < self.threshold + self.interval:
+					continue
+				frame = sys._current_frames().get(self._loop_thread)
+				if frame is not None:
+					self._stack = traceback.extract_stack(frame)
+
+	def _record(self, stack, lag):
+		site = call_site(stack)
+		entry = self.sites.setdefault(site, [0, 0.0, 0.0])
+		entry[0] += 1
+		entry[1] += lag
+		entry[2] = max(entry[2], lag)
+		logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms at {site[0]}:{site[1]} in {site[2]}\n"
+					+ "".join(traceback.format_list(stack[-8:])))
+
+	def top(self, limit=10):
+		"""Call sites ranked by total time blocked: ((filename, lineno, function), stalls, total, longest)"""
+		ranked = sorted(self.sites.items(), key=lambda item: item[1][1], reverse=True)
+		return [(site, stalls, total, longest) for site, (stalls, total, longest) in ranked[:limit]]
+
+def call_site(stack):
+	"""The innermost frame of our own code in a stack, or the innermost frame"""
+	for frame in reversed(stack):
+		if frame.filename.startswith(PROJECT_DIR) and not frame.filename.endswith("stall_watchdog.py"):
+			return (os.path.relpath(frame.filename, PROJECT_DIR), frame.lineno, frame.name)
+	frame = stack[-1]
+	return (frame.filename, frame.lineno, frame.name)
+
+watchdog = StallWatchdog(config.STALL_THRESHOLD_MS / 1000, config.STALL_CHECK_INTERVAL_MS / 1000)
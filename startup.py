@@ -0,0 +1,55 @@
+# startup.py - Startup phase timings and hash-gated command tree sync
+import hashlib
+import json
+import logging
+import time
+from database import get_meta, set_meta
+
+logger = logging.getLogger('chess_bot.startup')
+
+# Phases are timed from the first import of this module, which main.py does first
+_last = time.perf_counter()
+_phases = []
+_reported = False
+
+def mark(phase):
+	"""Record the time spent since the previous mark as phase (ignored once reported)"""
+	global _last
+	if _reported:
+		return
+	now = time.perf_counter()
+	_phases.append((phase, now - _last))
+	_last = now
+
+def report():
+	"""Log the startup timings once, on the first on_ready"""
+	global _reported
+	if _reported:
+		return
+	_reported = True
+	total = sum(duration for _, duration in _phases)
+	breakdown = ", ".join(f"{phase}={duration * 1000:.0f}ms" for phase, duration in _phases)
+	logger.info(f"Started in {total * 1000:.0f}ms ({breakdown})")
+
+def command_tree_hash(tree, guild=None):
+	"""Hash of the command definitions the tree would sync for guild (None for global)"""
+	payload = sorted((command.to_dict() for command in tree.get_commands(guild=guild)),
+					key=lambda command: (command.get("type", 1), command["name"]))
+	return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_command_tree(tree, guild=None):
+	"""Sync the tree for guild only if its definitions changed since the last sync
+
+	The hash of the last synced definitions is kept in the meta table, so
+	restarts and reconnects with unchanged commands make no API call.
+	"""
+	key = f"command_tree_hash:{guild.id}" if guild else "command_tree_hash:global"
+	digest = command_tree_hash(tree, guild)
+	scope = f"guild {guild.id}" if guild else "global"
+	if get_meta(key) == digest:
+		logger.info(f"Commands unchanged ({scope}), skipping sync")
+		return False
+	synced = await tree.sync(guild=guild)
+	set_meta(key, digest)
+	logger.info(f"Synced {len(synced)} command(s) ({scope})")
+	return True
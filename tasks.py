@@ -1,55 +1,136 @@
 # tasks.py - Background tasks
 from discord.ext import tasks
-import asyncio
+import datetime
+import json
 import logging
-from database import get_all_users, store_user_ratings, get_leaderboard_data
-from chess_api import fetch_chess_data
+import config
+import startup
+from database import (get_latest_refresh_run, get_meta, set_meta, get_refresh_digests, get_teams,
+					get_team_members, set_team_members, count_unfinished_refresh_runs)
+from digest import merge_digests, snapshot_ratings
+from refresh import run_refresh
+from ranking import engine
+from members import resolve_members
+from snapshot import save_snapshot
 import token_bot
 import discord
 
 logger = logging.getLogger('chess_bot.tasks')
 
+# Ids of the Top 5/10/25 roles by name, saved in snapshots
+top_role_ids = {}
+
 # Define the task but don't start it yet
-@tasks.loop(hours=24)
+@tasks.loop(hours=config.REFRESH_INTERVAL_HOURS)
 async def update_ratings(bot):
 	"""Update ratings for all registered users once per day"""
-	logger.info("Starting ratings update...")
-	
-	users = get_all_users()
-	
-	update_count = 0
-	for discord_id, chess_username in users:
-		# Add delay to avoid rate limiting
-		await asyncio.sleep(2)
-		
-		# Fetch new ratings
-		chess_data = await fetch_chess_data(chess_username)
-		if chess_data:
-			if store_user_ratings(discord_id, chess_data):
-				update_count += 1
-	
-	#get users ratings
-	users = get_leaderboard_data("overall")
-	# Process for overall ratings
-	user_ratings = []
-	for user in users:
-		discord_id, chess_username, rapid, blitz, bullet, puzzle = user
-		ratings = [r for r in [rapid, blitz, bullet] if r is not None]
-		avg_rating = sum(ratings) / len(ratings) if ratings else 0
-		user_ratings.append((discord_id, chess_username, rapid, blitz, bullet, avg_rating))
-	
-	# Get users sorted by average rating
-	user_ratings.sort(key=lambda x: x[5], reverse=True)
-	user_ratings = list(enumerate(user_ratings, start=1))
+	run_id = await run_refresh("bot")
+	await sync_top_roles(bot)
+	sync_role_teams(bot)
+	set_meta("roles_synced_run", run_id)
+	await post_digests(bot)
+
+@tasks.loop(minutes=config.REFRESH_POLL_MINUTES)
+async def sync_roles_from_worker(bot):
+	"""Sync roles and post digests once the worker process has finished a refresh"""
+	await post_digests(bot)
+	run = get_latest_refresh_run()
+	if run is None or str(run[0]) == get_meta("roles_synced_run"):
+		return
+	logger.info(f"Refresh run {run[0]} finished by {run[1]}, syncing roles")
+	await sync_top_roles(bot)
+	sync_role_teams(bot)
+	set_meta("roles_synced_run", run[0])
+
+@tasks.loop(minutes=config.SNAPSHOT_INTERVAL_MINUTES)
+async def save_snapshot_periodically():
+	"""Keep the snapshot used for warm restarts recent"""
+	save_snapshot(top_role_ids)
+
+def build_digest_embed(digest):
+	"""Embed summarizing a refresh run's digest, or None if no rating changed"""
+	if not (digest["gains"] or digest["losses"] or digest["personal_bests"] or digest["rank_changes"]):
+		return None
+	names = {"rapid": "Rapid", "blitz": "Blitz", "bullet": "Bullet", "puzzle": "Puzzle", "puzzle_rush": "Puzzle Rush"}
+	embed = discord.Embed(
+		title="Rating update",
+		description=f"{digest['changed']} of {digest['players']} players changed rating",
+		color=0x00BFFF
+	)
+	def movers(changes):
+		return "\n".join(f"**{change['username']}** {names[change['category']]}: "
+						f"{change['old']} → {change['new']} ({change['delta']:+d})" for change in changes)
+	if digest["gains"]:
+		embed.add_field(name="Biggest gains", value=movers(digest["gains"]), inline=False)
+	if digest["losses"]:
+		embed.add_field(name="Biggest losses", value=movers(digest["losses"]), inline=False)
+	if digest["personal_bests"]:
+		embed.add_field(name="New personal bests", value="\n".join(
+			f"**{best['username']}** {names[best['category']]}: {best['new']} (previous best {best['old']})"
+			for best in digest["personal_bests"]), inline=False)
+	if digest["rank_changes"]:
+		embed.add_field(name="Overall rank changes", value="\n".join(
+			f"**{change['username']}**: #{change['old']} → #{change['new']}"
+			for change in digest["rank_changes"]), inline=False)
+	return embed
+
+async def post_digests(bot):
+	"""Post the refresh runs finished since the last post as a single digest message per channel
+
+	Worker partitions finish at different times, so nothing is posted while
+	a run started within the refresh interval is still going; older
+	unfinished runs are taken to have crashed.
+	"""
+	if not config.DIGEST_CHANNEL_IDS:
+		return
+	started_after = datetime.datetime.now() - datetime.timedelta(hours=config.REFRESH_INTERVAL_HOURS)
+	if count_unfinished_refresh_runs(started_after):
+		return
+	last_posted = get_meta("digest_posted_run")
+	runs = get_refresh_digests(int(last_posted or 0))
+	if last_posted is None:
+		# Never posted before, start from the latest run rather than the whole history
+		runs = runs[-1:]
+	if not runs:
+		return
+	embed = build_digest_embed(merge_digests([json.loads(digest) for _, digest in runs if digest],
+										snapshot_ratings()))
+	if embed:
+		for channel_id in config.DIGEST_CHANNEL_IDS:
+			try:
+				channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+				await channel.send(embed=embed)
+			except discord.HTTPException as e:
+				logger.error(f"Failed to post the rating digest to channel {channel_id}: {e}")
+	set_meta("digest_posted_run", runs[-1][0])
+
+def _top_role(guild, name):
+	"""A Top role by its saved id, falling back to a lookup by name"""
+	role = guild.get_role(top_role_ids.get(name, 0))
+	if role is None or role.name != name:
+		role = discord.utils.get(guild.roles, name=name)
+		if role is not None:
+			top_role_ids[name] = role.id
+	return role
+
+async def sync_top_roles(bot):
+	"""Give the Top 5/10/25 roles to the best players by average rating"""
+	# Get the best 25 users by average rating
+	user_ratings = engine.top("overall", 25)
 	
 	#Setup the bot variables for roles
 	logger.info(bot.user)
 	guild = bot.get_guild(int(token_bot.MY_GUILD))
+	# Resolve this run's top players and the previous holders of the roles, so
+	# role.members below is complete in lean intents mode too
+	previous = [int(discord_id) for discord_id in (get_meta("top_role_members") or "").split(",") if discord_id]
+	top_ids = [user[0] for _, user in user_ratings]
+	members = await resolve_members(guild, list(dict.fromkeys(top_ids + previous)))
 	#Loop through 25 first users and set the roles
 	top_roles = [["Top 5"], ["Top 10"], ["Top 25"]]
 	for role in top_roles:
-		role.append(discord.utils.get(guild.roles, name=role[0]))
-	print(top_roles)
+		role.append(_top_role(guild, role[0]))
+	logger.debug(f"Top roles: {top_roles}")
 	for role in top_roles:
 		for member in role[1].members:
 			try:
@@ -57,47 +138,82 @@ async def update_ratings(bot):
 				await member.remove_roles(role[1])
 			except:
 				continue
-	for index, user in user_ratings[:25]:
+	for index, user in user_ratings:
 		discord_id, chess_username, rapid, blitz, bullet, avg_rating = user
-		member = guild.get_member(discord_id)
+		member = members.get(discord_id)
 		if member == None:
-			try:
-				member = await guild.fetch_member(discord_id)  # fallback
-			except:
-				logger.info(str(index)+":"+chess_username+" not found")
-				continue
+			logger.info(f"{index}:{chess_username} not found")
+			continue
 		if index <= 5:
 			try:
 				await member.add_roles(top_roles[0][1])
 			except:
 				continue
-			logger.info("top 5:"+chess_username)
+			logger.info(f"top 5:{chess_username}")
 		elif index <= 10:
 			try:
 				await member.add_roles(top_roles[1][1])
 			except:
 				continue
-			logger.info("top 10:"+chess_username)
+			logger.info(f"top 10:{chess_username}")
 		elif index <= 25:
 			try:
 				await member.add_roles(top_roles[2][1])
 			except:
 				continue
-			logger.info("top 25:"+chess_username)
+			logger.info(f"top 25:{chess_username}")
+	set_meta("top_role_members", ",".join(str(discord_id) for discord_id in top_ids))
 
-	#logger.info(f"Ratings update complete! Updated {update_count}/{len(users)} users.")
-	
+def sync_role_teams(bot):
+	"""Mirror the members of role-based teams, writing only teams whose membership changed
+
+	Reads role.members from the member cache, which only holds everyone once
+	the guild is chunked. In lean intents mode it holds just the resolved top
+	players, so the sync is skipped rather than replacing teams from a
+	partial list.
+	"""
+	if config.LEAN_INTENTS:
+		return
+	guild = bot.get_guild(int(token_bot.MY_GUILD))
+	if guild is None or not guild.chunked:
+		logger.info("Member cache of the home guild is incomplete, not syncing role-based teams")
+		return
+	current = {}
+	for team_id, discord_id in get_team_members():
+		current.setdefault(team_id, set()).add(discord_id)
+	for team_id, name, role_id in get_teams():
+		if role_id is None:
+			continue
+		role = guild.get_role(role_id)
+		if role is None:
+			logger.warning(f"Role {role_id} of team {name} no longer exists")
+			continue
+		members = {member.id for member in role.members}
+		if members != current.get(team_id, set()):
+			logger.info(f"Team {name} now has {len(members)} member(s)")
+			set_team_members(team_id, members, replace=True)
 
 @update_ratings.before_loop
 async def before_update_ratings():
 	"""Wait until the bot is ready before starting the task"""
 	pass  # This will be replaced in register_tasks
 
+def owns_home_guild(bot):
+	"""Whether this process runs the shard of the home guild, where background tasks run"""
+	if bot.shard_count is None:
+		return True
+	shard_id = (int(token_bot.MY_GUILD) >> 22) % bot.shard_count
+	shard_ids = getattr(bot, "shard_ids", None)
+	return shard_ids is None or shard_id in shard_ids
+
 def register_tasks(bot):
 	"""Register tasks with the bot"""
 	
+	# Pick the loop for the configured refresh mode
+	loop = sync_roles_from_worker if config.REFRESH_MODE == "worker" else update_ratings
+
 	# Set the proper before_loop handler with the bot reference
-	@update_ratings.before_loop
+	@loop.before_loop
 	async def before_update_ratings():
 		await bot.wait_until_ready()
 	
@@ -105,12 +221,13 @@ def register_tasks(bot):
 	@bot.event
 	async def on_ready():
 		logger.info(f'Logged in as {bot.user}')
-		try:
-			synced = await bot.tree.sync()
-			logger.info(f"Synced {len(synced)} command(s)")
-		except Exception as e:
-			logger.error(f"Failed to sync commands: {e}")
+		startup.mark("connect")
+		startup.report()
 		
 		# Start the task here, in the async context
-		if not update_ratings.is_running():
-			update_ratings.start(bot)
+		if not owns_home_guild(bot):
+			logger.info("Home guild is on another shard's process, not running background tasks")
+		elif not loop.is_running():
+			loop.start(bot)
+		if config.SNAPSHOT_INTERVAL_MINUTES > 0 and not save_snapshot_periodically.is_running():
+			save_snapshot_periodically.start()
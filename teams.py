@@ -0,0 +1,153 @@
+# teams.py - Team leaderboards from incrementally maintained per-team aggregates
+import bisect
+import logging
+import config
+from database import get_latest_ratings, get_data_version, get_teams, get_team_members, add_listener
+from ranking import CATEGORIES, category_scores
+from tracing import span
+
+logger = logging.getLogger('chess_bot.teams')
+
+METRICS = ("average", "median", "top_sum")
+
+def team_scores(ratings):
+	"""Scores a player contributes to their teams; overall only counts players with a rapid, blitz or bullet rating"""
+	scores = category_scores(ratings)
+	if all(rating is None for rating in ratings[:3]):
+		scores["overall"] = None
+	return scores
+
+class TeamAggregate:
+	"""Running sum and sorted scores of one team in one category"""
+
+	__slots__ = ("total", "scores")
+
+	def __init__(self):
+		self.total = 0
+		self.scores = []
+
+	def add(self, score):
+		self.total += score
+		bisect.insort(self.scores, score)
+
+	def remove(self, score):
+		self.total -= score
+		del self.scores[bisect.bisect_left(self.scores, score)]
+
+	def value(self, metric, top_n):
+		"""The team's score for a metric, None without rated members"""
+		scores = self.scores
+		if not scores:
+			return None
+		if metric == "average":
+			return self.total / len(scores)
+		if metric == "median":
+			middle = len(scores) // 2
+			return scores[middle] if len(scores) % 2 else (scores[middle - 1] + scores[middle]) / 2
+		return sum(scores[-top_n:])
+
+class TeamRankings:
+	"""Team aggregates updated in place when a member's ratings change
+
+	Membership changes are rare admin actions and trigger a rebuild, like
+	writes from another process. The sorted team order of each category and
+	metric is cached until an aggregate changes.
+	"""
+
+	def __init__(self, top_n=config.TEAM_TOP_N):
+		self.top_n = top_n
+		self.version = None
+		self._names = {}
+		# discord_id -> ids of the player's teams
+		self._teams_of = {}
+		# discord_id -> team_scores of players in at least one team
+		self._scores = {}
+		self._aggregates = {}
+		# (category, metric) -> [(value, team_id)] best first
+		self._order = {}
+
+	def _fresh(self):
+		version = get_data_version()
+		if version != self.version:
+			self.rebuild(version)
+
+	def rebuild(self, version):
+		with span("db"):
+			teams = get_teams()
+			memberships = get_team_members()
+			ratings = get_latest_ratings()
+		self._names = {team_id: name for team_id, name, _ in teams}
+		self._teams_of = {}
+		for team_id, discord_id in memberships:
+			self._teams_of.setdefault(discord_id, set()).add(team_id)
+		self._aggregates = {(team_id, category): TeamAggregate() for team_id in self._names for category in CATEGORIES}
+		self._scores = {}
+		self._order = {}
+		for row in ratings:
+			if row[0] in self._teams_of:
+				self._set_scores(row[0], team_scores(row[2:]))
+		self.version = version
+		logger.info(f"Rebuilt {len(self._names)} teams at version {version}")
+
+	def _set_scores(self, discord_id, scores):
+		"""Replace a member's contribution to each of their teams (None removes it)"""
+		team_ids = self._teams_of.get(discord_id)
+		if not team_ids:
+			return
+		previous = self._scores.pop(discord_id, None)
+		for team_id in team_ids:
+			for category in CATEGORIES:
+				aggregate = self._aggregates[(team_id, category)]
+				if previous and previous[category] is not None:
+					aggregate.remove(previous[category])
+				if scores and scores[category] is not None:
+					aggregate.add(scores[category])
+		if scores is not None:
+			self._scores[discord_id] = scores
+		self._order = {}
+
+	def on_change(self, event, version, **data):
+		"""database listener keeping the aggregates in step with local writes"""
+		if self.version is None or version != self.version + 1:
+			self.version = None
+			return
+		if event == "ratings":
+			discord_id = data["discord_id"]
+			if discord_id in self._teams_of and discord_id not in self._scores:
+				# A first rating, or ratings stored after the player unregistered,
+				# which the users join in SQL leaves out; let a rebuild decide
+				self.version = None
+				return
+			self._set_scores(discord_id, team_scores(data["ratings"]))
+		elif event == "unregister":
+			self._set_scores(data["discord_id"], None)
+			# Unregistering removes the player's team memberships too
+			self._teams_of.pop(data["discord_id"], None)
+		elif event == "teams":
+			self.version = None
+			return
+		self.version = version
+
+	def _ordered(self, category, metric):
+		order = self._order.get((category, metric))
+		if order is None:
+			values = ((self._aggregates[(team_id, category)].value(metric, self.top_n), team_id)
+					for team_id in self._names)
+			order = sorted(((value, team_id) for value, team_id in values if value is not None), reverse=True)
+			self._order[(category, metric)] = order
+		return order
+
+	def count(self, category, metric):
+		"""Number of teams with rated members in a category"""
+		self._fresh()
+		return len(self._ordered(category, metric))
+
+	def page(self, category, metric, page, per_page=25):
+		"""(rank, team name, value, rated members) of one page"""
+		self._fresh()
+		start = (page - 1) * per_page
+		return [(start + offset + 1, self._names[team_id], value, len(self._aggregates[(team_id, category)].scores))
+				for offset, (value, team_id) in enumerate(self._ordered(category, metric)[start:start + per_page])]
+
+team_rankings = TeamRankings()
+add_listener(team_rankings.on_change)
@@ -0,0 +1,31 @@
+# conftest.py - Shared fixtures: an empty database per test, with the in-memory engines reset
+import contextlib
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from ranking import engine
+from teams import team_rankings
+from username_index import usernames
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+	"""An empty database in tmp_path, which the engines rebuild from on first use"""
+	monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+	database.setup_database()
+	for index in (engine, team_rankings, usernames):
+		monkeypatch.setattr(index, "version", None)
+	return database
+
+@pytest.fixture
+def other_process(monkeypatch):
+	"""Context manager for writes the engines aren't told about, like those of another process"""
+	@contextlib.contextmanager
+	def writes():
+		with monkeypatch.context() as patch:
+			patch.setattr(database, "_listeners", [])
+			yield
+	return writes
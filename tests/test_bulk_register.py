@@ -0,0 +1,29 @@
+from bulk_register import parse_registrations
+
+def _parse(text):
+	return list(parse_registrations(text.splitlines()))
+
+def test_valid_rows_and_header():
+	rows = _parse("discord_id,username\n123456789012345678,magnus\n<@!223456789012345678>, hikaru \n")
+	assert rows == [
+		(2, 123456789012345678, "magnus", None),
+		(3, 223456789012345678, "hikaru", None),
+	]
+
+def test_blank_lines_are_skipped():
+	assert _parse("\n123456789012345678,magnus\n,\n") == [(2, 123456789012345678, "magnus", None)]
+
+def test_invalid_rows_are_reported_with_their_line():
+	rows = _parse("123456789012345678,magnus\nnot-an-id,hikaru\n223456789012345678,no spaces\n"
+				"323456789012345678\n123456789012345678,again\n")
+	assert [(line_number, error) for line_number, _, _, error in rows] == [
+		(1, None),
+		(2, "invalid Discord id 'not-an-id'"),
+		(3, "invalid Chess.com username 'no spaces'"),
+		(4, "expected discord_id,username"),
+		(5, "duplicate Discord id"),
+	]
+
+def test_header_is_only_allowed_on_the_first_line():
+	rows = _parse("123456789012345678,magnus\ndiscord_id,username\n")
+	assert rows[1] == (2, None, "username", "invalid Discord id 'discord_id'")
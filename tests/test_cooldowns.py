@@ -0,0 +1,22 @@
+from cooldowns import Cooldown
+
+def test_allows_rate_uses_per_window():
+	cooldown = Cooldown(2, 60)
+	assert cooldown.retry_after(1, now=0) == 0
+	cooldown.hit(1, now=0)
+	cooldown.hit(1, now=10)
+	assert cooldown.retry_after(1, now=20) == 40
+
+def test_window_slides():
+	cooldown = Cooldown(2, 60)
+	cooldown.hit(1, now=0)
+	cooldown.hit(1, now=10)
+	assert cooldown.retry_after(1, now=60) == 0
+	cooldown.hit(1, now=60)
+	assert cooldown.retry_after(1, now=65) == 5
+
+def test_keys_are_independent():
+	cooldown = Cooldown(1, 30)
+	cooldown.hit(1, now=0)
+	assert cooldown.retry_after(1, now=1) == 29
+	assert cooldown.retry_after(2, now=1) == 0
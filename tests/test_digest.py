@@ -0,0 +1,73 @@
+import random
+from digest import build_digest, merge_digests
+
+def _players(rng, count):
+	return {discord_id: (f"player{discord_id}", *(rng.choice([None, *range(1000, 2000, 7)]) for _ in range(5)))
+			for discord_id in range(1, count + 1)}
+
+def _refresh(rng, players, refreshed):
+	after = dict(players)
+	for discord_id in refreshed:
+		after[discord_id] = (players[discord_id][0], *(rng.choice([None, *range(1000, 2000, 7)]) for _ in range(5)))
+	return after
+
+def test_build_digest_reports_changes_of_refreshed_players(db):
+	before = {1: ("alice", 1500, 1400, None, 2000, 30), 2: ("bob", 1400, None, None, None, None)}
+	after = {1: ("alice", 1480, 1420, 1300, 2000, 30), 2: ("bob", 1600, None, None, None, None)}
+	digest = build_digest(before, after, [1, 2])
+	assert digest["players"] == 2
+	assert digest["changed"] == 2
+	assert [(change["username"], change["category"], change["delta"]) for change in digest["gains"]] == [
+		("bob", "rapid", 200), ("alice", "blitz", 20)]
+	assert [(change["username"], change["category"], change["delta"]) for change in digest["losses"]] == [
+		("alice", "rapid", -20)]
+	assert sorted((change["username"], change["old"], change["new"]) for change in digest["rank_changes"]) == [
+		("alice", 1, 2), ("bob", 2, 1)]
+
+def test_personal_bests_are_reported_once_beaten(db):
+	before = {1: ("alice", 1500, None, None, None, None)}
+	first = {1: ("alice", 1550, None, None, None, None)}
+	assert build_digest(before, first, [1])["personal_bests"] == []
+	second = {1: ("alice", 1600, None, None, None, None)}
+	bests = build_digest(first, second, [1])["personal_bests"]
+	assert [(best["category"], best["old"], best["new"]) for best in bests] == [("rapid", 1550, 1600)]
+
+def test_partition_digests_merge_like_one_run(db):
+	rng = random.Random(4)
+	before = _players(rng, 60)
+	partitions = [list(range(1, 61))[index::3] for index in range(3)]
+	digests = []
+	snapshot = before
+	for refreshed in partitions:
+		after = _refresh(rng, snapshot, refreshed)
+		digests.append(build_digest(snapshot, after, refreshed, limit=1000))
+		snapshot = after
+	merged = merge_digests(digests, current=snapshot, limit=1000)
+	whole = build_digest(before, snapshot, list(range(1, 61)), limit=1000)
+	assert (merged["players"], merged["changed"]) == (whole["players"], whole["changed"])
+	# Ties on delta may come out in another order
+	for key in ("gains", "losses"):
+		order = lambda change: (change["delta"], change["discord_id"], change["category"])
+		assert sorted(merged[key], key=order) == sorted(whole[key], key=order)
+
+def test_merged_rank_changes_run_from_first_old_to_current_rank():
+	digests = [
+		{"players": 1, "changed": 0, "gains": [], "losses": [], "personal_bests": [],
+		"rank_changes": [{"discord_id": 1, "username": "alice", "old": 5, "new": 3}]},
+		{"players": 1, "changed": 0, "gains": [], "losses": [], "personal_bests": [],
+		"rank_changes": [{"discord_id": 1, "username": "alice", "old": 3, "new": 2}]},
+	]
+	assert merge_digests(digests)["rank_changes"] == [{"discord_id": 1, "username": "alice", "old": 5, "new": 2}]
+	# Later partitions moved the player again; current has the final rank
+	current = {1: ("alice", 1500, None, None, None, None), 2: ("bob", 1600, None, None, None, None)}
+	assert merge_digests(digests, current)["rank_changes"] == [{"discord_id": 1, "username": "alice", "old": 5, "new": 2}]
+	current[2] = ("bob", 1400, None, None, None, None)
+	assert merge_digests(digests, current)["rank_changes"] == [{"discord_id": 1, "username": "alice", "old": 5, "new": 1}]
+
+def test_merge_applies_the_limit():
+	gains = [{"discord_id": discord_id, "username": f"p{discord_id}", "category": "rapid",
+			"old": 1000, "new": 1000 + discord_id, "delta": discord_id} for discord_id in range(1, 11)]
+	digest = {"players": 10, "changed": 10, "gains": gains, "losses": [], "personal_bests": [], "rank_changes": []}
+	merged = merge_digests([digest, {**digest, "gains": []}], limit=3)
+	assert [gain["delta"] for gain in merged["gains"]] == [10, 9, 8]
+	assert merged["players"] == 20
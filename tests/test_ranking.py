@@ -0,0 +1,89 @@
+import random
+import pytest
+from database import register_user, store_user_ratings, unregister_user, register_users_bulk, iter_leaderboard
+from ranking import CATEGORIES, CategoryRanking, RankingEngine, engine
+
+def _standings(ranking_engine):
+	"""Every category's full order, for comparing engines"""
+	return {category: ranking_engine.page(category, 1, 10 ** 6) for category in CATEGORIES}
+
+def _rebuilt():
+	fresh = RankingEngine()
+	fresh.rebuild(engine.version)
+	return fresh
+
+def test_category_ranking_orders_by_score_then_higher_id():
+	ranking = CategoryRanking()
+	ranking.build([(1, 1500), (2, 1600), (3, 1500), (4, None), (5, 1400)])
+	assert ranking.ids(0, 10) == [2, 3, 1, 5]
+	assert ranking.rank_of(1) == 3
+	assert ranking.rank_of(4) is None
+	assert len(ranking) == 4
+
+def test_category_ranking_updates_match_build():
+	rng = random.Random(1)
+	scores = {discord_id: rng.choice([None, *range(1000, 1020)]) for discord_id in range(200)}
+	ranking = CategoryRanking()
+	ranking.build(scores.items())
+	for _ in range(2000):
+		discord_id = rng.randrange(200)
+		scores[discord_id] = rng.choice([None, *range(1000, 1020)])
+		ranking.update(discord_id, scores[discord_id])
+	expected = CategoryRanking()
+	expected.build(scores.items())
+	assert ranking.dump() == expected.dump()
+	assert all(ranking.rank_of(discord_id) == expected.rank_of(discord_id) for discord_id in scores)
+
+def test_category_ranking_restore_round_trip():
+	ranking = CategoryRanking()
+	ranking.build([(1, 1500), (2, 1600.5), (3, 1500)])
+	restored = CategoryRanking()
+	restored.restore(*ranking.dump())
+	assert restored.ids(0, 10) == [2, 3, 1]
+	assert restored.rank_of(1) == 3
+
+def test_engine_incremental_updates_match_rebuild(db):
+	rng = random.Random(2)
+	for discord_id in range(1, 31):
+		register_user(discord_id, f"player{discord_id}")
+	engine.count("overall")
+	for _ in range(300):
+		discord_id = rng.randrange(1, 41)
+		action = rng.random()
+		if action < 0.7:
+			store_user_ratings(discord_id, tuple(rng.choice([None, *range(1200, 1210)]) for _ in range(5)))
+		elif action < 0.85:
+			register_user(discord_id, f"player{discord_id}")
+		else:
+			unregister_user(discord_id)
+		# Reading rebuilds a stale engine, so later writes are applied incrementally again
+		engine.count("overall")
+	assert _standings(engine) == _standings(_rebuilt())
+
+def test_ratings_stored_after_unregister_are_not_ranked(db):
+	register_user(1, "alice")
+	store_user_ratings(1, (1500, 1500, 1500, 1500, 20))
+	assert engine.rank_of("rapid", 1) == 1
+	unregister_user(1)
+	# A refresh fetched the player before they unregistered and stores late
+	store_user_ratings(1, (1600, 1600, 1600, 1600, 25))
+	assert engine.rank_of("rapid", 1) is None
+	assert engine.count("rapid") == 0
+
+def test_engine_rebuilds_after_writes_of_another_process(db, other_process):
+	register_user(1, "alice")
+	store_user_ratings(1, (1500, None, None, None, None))
+	assert engine.count("rapid") == 1
+	with other_process():
+		register_users_bulk([(2, "bob", (1600, None, None, None, None))])
+	assert engine.rank_of("rapid", 2) == 1
+	assert engine.rank_of("rapid", 1) == 2
+
+@pytest.mark.parametrize("category", CATEGORIES)
+def test_engine_order_matches_iter_leaderboard(db, category):
+	rng = random.Random(3)
+	register_users_bulk([(discord_id, f"player{discord_id}",
+						tuple(rng.choice([None, 1500, 1600]) for _ in range(5)))
+						for discord_id in range(1, 51)])
+	ranked = [row[0] for _, row in engine.page(category, 1, 100)]
+	assert ranked == [row[0] for row in iter_leaderboard(category, batch_size=7)]
@@ -0,0 +1,68 @@
+import pytest
+import snapshot
+from database import register_users_bulk, store_user_ratings
+from ranking import engine
+from username_index import usernames
+
+@pytest.fixture
+def players(db):
+	register_users_bulk([(1, "alice", (1500, 1400, None, 2000, 30)),
+						(2, "bob", (None, None, None, None, None)),
+						(3, "carol", (1700, None, 1650, None, None))])
+	engine.count("overall")
+	usernames.complete("")
+
+def test_encode_decode_round_trip(players):
+	state = engine.dump()
+	version, pairs = usernames.dump()
+	data = snapshot.encode(state, pairs, [11, 22])
+	decoded_version, decoded_players, rankings, decoded_pairs, role_ids = snapshot.decode(data)
+	assert (decoded_version, decoded_players) == state[:2]
+	assert rankings == state[2]
+	assert decoded_pairs == pairs
+	assert role_ids == [11, 22]
+
+def test_encode_without_usernames(players):
+	*_, decoded_pairs, role_ids = snapshot.decode(snapshot.encode(engine.dump(), None, []))
+	assert decoded_pairs is None
+	assert role_ids == []
+
+def test_corrupted_payload_is_rejected(players):
+	data = bytearray(snapshot.encode(engine.dump(), None, []))
+	data[-1] ^= 0xFF
+	with pytest.raises(ValueError, match="checksum"):
+		snapshot.decode(bytes(data))
+
+def test_unknown_format_is_rejected(players):
+	data = snapshot.encode(engine.dump(), None, [])
+	with pytest.raises(ValueError, match="format"):
+		snapshot.decode(b"NOTSNP" + data[6:])
+
+def test_save_and_load_restores_the_engines(players, tmp_path):
+	path = str(tmp_path / "state.snapshot")
+	expected = engine.page("overall", 1)
+	assert snapshot.save_snapshot([5], path)
+	engine.version = usernames.version = None
+	assert snapshot.load_snapshot(path) == [5]
+	assert engine.version is not None and usernames.version == engine.version
+	assert engine.page("overall", 1) == expected
+	assert usernames.lookup("carol") == 3
+
+def test_stale_snapshot_is_ignored(players, tmp_path):
+	path = str(tmp_path / "state.snapshot")
+	snapshot.save_snapshot([], path)
+	store_user_ratings(1, (1600, 1400, None, 2000, 30))
+	engine.version = None
+	assert snapshot.load_snapshot(path) is None
+	assert engine.version is None
+
+def test_missing_or_unreadable_snapshot(db, tmp_path):
+	path = tmp_path / "state.snapshot"
+	assert snapshot.load_snapshot(str(path)) is None
+	path.write_bytes(b"garbage")
+	assert snapshot.load_snapshot(str(path)) is None
+
+def test_nothing_saved_before_the_rankings_are_built(db, tmp_path):
+	path = tmp_path / "state.snapshot"
+	assert not snapshot.save_snapshot([], str(path))
+	assert not path.exists()
@@ -0,0 +1,52 @@
+from database import register_user, unregister_user, register_users_bulk, get_all_users
+from username_index import UsernameIndex, usernames
+
+def test_complete_is_case_insensitive_and_alphabetical(db):
+	for discord_id, name in enumerate(["magnus", "Maxime", "hikaru", "MAGNUSfan", "mamedyarov"], start=1):
+		register_user(discord_id, name)
+	assert usernames.complete("ma") == ["magnus", "MAGNUSfan", "mamedyarov", "Maxime"]
+	assert usernames.complete("MAG", limit=1) == ["magnus"]
+	assert usernames.complete("z") == []
+
+def test_lookup_any_case(db):
+	register_user(7, "Hikaru")
+	assert usernames.lookup("hikaru") == 7
+	assert usernames.lookup("HIKARU") == 7
+	assert usernames.lookup("hikar") is None
+
+def test_local_writes_update_in_place(db):
+	register_user(1, "alice")
+	assert usernames.complete("a") == ["alice"]
+	register_user(1, "anna")
+	register_user(2, "bob")
+	unregister_user(2)
+	version = usernames.version
+	assert usernames.complete("") == ["anna"]
+	assert usernames.version == version
+
+def test_reloads_after_writes_of_another_process(db, other_process):
+	register_user(1, "alice")
+	assert usernames.lookup("alice") == 1
+	with other_process():
+		unregister_user(1)
+		register_users_bulk([(2, "alicia", (None,) * 5)])
+	assert usernames.lookup("alice") is None
+	assert usernames.complete("ali") == ["alicia"]
+
+def test_missed_write_marks_the_index_stale(db):
+	register_user(1, "alice")
+	usernames.complete("")
+	usernames.on_change("register", usernames.version + 2, discord_id=2, chess_username="bob")
+	assert usernames.version is None
+
+def test_dump_and_restore(db):
+	register_users_bulk([(discord_id, f"player{discord_id}", (None,) * 5) for discord_id in range(1, 6)])
+	usernames.complete("")
+	version, pairs = usernames.dump()
+	restored = UsernameIndex()
+	restored.restore(version, pairs)
+	assert sorted(pairs) == sorted(get_all_users())
+	assert restored._keys == usernames._keys
+
+def test_not_loaded_has_nothing_to_dump():
+	assert UsernameIndex().dump() is None
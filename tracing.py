@@ -0,0 +1,83 @@
+# tracing.py - Per-interaction latency tracing for slash commands
+import contextvars
+import functools
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import config
+
+logger = logging.getLogger('chess_bot.tracing')
+
+# Trace of the interaction being handled by the current task
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+class Trace:
+	"""Spans recorded while handling one interaction"""
+
+	def __init__(self, command, interaction_id):
+		self.command = command
+		self.interaction_id = interaction_id
+		self.start = time.perf_counter()
+		self.spans = []
+
+	def elapsed(self):
+		return time.perf_counter() - self.start
+
+	def breakdown(self):
+		return ", ".join(f"{name}={duration * 1000:.0f}ms" for name, duration in self.spans)
+
+class LatencyStats:
+	"""Rolling window of latencies per command"""
+
+	def __init__(self, window):
+		self._samples = defaultdict(lambda: deque(maxlen=window))
+
+	def record(self, command, seconds):
+		self._samples[command].append(seconds)
+
+	def percentiles(self, command):
+		"""p50, p95 and p99 in seconds, from the most recent samples"""
+		samples = sorted(self._samples[command])
+		if not samples:
+			return None
+		def pick(fraction):
+			return samples[min(int(fraction * len(samples)), len(samples) - 1)]
+		return {"count": len(samples), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+	def summary(self):
+		return {command: self.percentiles(command) for command in sorted(self._samples)}
+
+stats = LatencyStats(config.TRACE_WINDOW)
+
+@contextmanager
+def span(name):
+	"""Time a step of the current interaction (a no-op outside traced commands)"""
+	trace = _current_trace.get()
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		if trace is not None:
+			trace.spans.append((name, time.perf_counter() - start))
+
+def traced(callback):
+	"""Wrap a slash command callback so its interactions are timed and slow ones logged"""
+	@functools.wraps(callback)
+	async def wrapper(interaction, *args, **kwargs):
+		command = interaction.command.name if interaction.command else callback.__name__
+		trace = Trace(command, interaction.id)
+		token = _current_trace.set(trace)
+		try:
+			return await callback(interaction, *args, **kwargs)
+		finally:
+			_current_trace.reset(token)
+			elapsed = trace.elapsed()
+			stats.record(command, elapsed)
+			if elapsed * 1000 >= config.TRACE_SLOW_MS:
+				logger.warning(f"Slow interaction {trace.interaction_id} /{command}: "
+							f"{elapsed * 1000:.0f}ms ({trace.breakdown()})")
+			else:
+				logger.debug(f"Interaction {trace.interaction_id} /{command}: "
+							f"{elapsed * 1000:.0f}ms ({trace.breakdown()})", extra={"sample": f"trace.{command}"})
+	return wrapper
@@ -0,0 +1,98 @@
+# username_index.py - In-memory prefix index of registered Chess.com usernames
+import bisect
+import logging
+from database import get_all_users, get_data_version, add_listener
+
+logger = logging.getLogger('chess_bot.username_index')
+
+class UsernameIndex:
+	"""Case-insensitive prefix index kept as a sorted list searched with bisect
+
+	Like the ranking engine, it is updated in place for writes made by this
+	process and reloaded when another process wrote to the database.
+	"""
+
+	def __init__(self):
+		# Sorted (folded username, discord_id, chess_username)
+		self._keys = []
+		self._usernames = {}
+		# Data version the index reflects, None when it must be (re)loaded
+		self.version = None
+
+	def _fresh(self):
+		version = get_data_version()
+		if version != self.version:
+			self.load(version)
+
+	def load(self, version):
+		"""Build the index from the users table"""
+		self._usernames = {discord_id: chess_username for discord_id, chess_username in get_all_users()}
+		self._keys = sorted((chess_username.casefold(), discord_id, chess_username)
+							for discord_id, chess_username in self._usernames.items())
+		self.version = version
+		logger.info(f"Indexed {len(self._keys)} usernames at version {version}")
+
+	def dump(self):
+		"""(version, [(discord_id, chess_username)] in index order) for snapshots, None if not loaded"""
+		if self.version is None:
+			return None
+		return self.version, [(discord_id, chess_username) for _, discord_id, chess_username in self._keys]
+
+	def restore(self, version, usernames):
+		"""Build the index from (discord_id, chess_username) pairs saved by dump at version"""
+		self._usernames = dict(usernames)
+		self._keys = sorted((chess_username.casefold(), discord_id, chess_username)
+							for discord_id, chess_username in self._usernames.items())
+		self.version = version
+
+	def add(self, discord_id, chess_username):
+		self.remove(discord_id)
+		bisect.insort(self._keys, (chess_username.casefold(), discord_id, chess_username))
+		self._usernames[discord_id] = chess_username
+
+	def remove(self, discord_id):
+		chess_username = self._usernames.pop(discord_id, None)
+		if chess_username is None:
+			return
+		key = (chess_username.casefold(), discord_id, chess_username)
+		position = bisect.bisect_left(self._keys, key)
+		if position < len(self._keys) and self._keys[position] == key:
+			del self._keys[position]
+
+	def complete(self, prefix, limit=25):
+		"""Registered usernames starting with prefix, in alphabetical order"""
+		self._fresh()
+		prefix = prefix.casefold()
+		matches = []
+		position = bisect.bisect_left(self._keys, (prefix,))
+		while position < len(self._keys) and len(matches) < limit:
+			folded, discord_id, chess_username = self._keys[position]
+			if not folded.startswith(prefix):
+				break
+			matches.append(chess_username)
+			position += 1
+		return matches
+
+	def lookup(self, chess_username):
+		"""discord_id registered with a username (any case), or None"""
+		self._fresh()
+		folded = chess_username.casefold()
+		position = bisect.bisect_left(self._keys, (folded,))
+		if position < len(self._keys) and self._keys[position][0] == folded:
+			return self._keys[position][1]
+		return None
+
+	def on_change(self, event, version, **data):
+		"""database listener keeping the index in step with registrations"""
+		if self.version is None or version != self.version + 1:
+			# Missed a write (or never loaded), reload on the next read
+			self.version = None
+			return
+		if event == "register":
+			self.add(data["discord_id"], data["chess_username"])
+		elif event == "unregister":
+			self.remove(data["discord_id"])
+		self.version = version
+
+usernames = UsernameIndex()
+add_listener(usernames.on_change)
@@ -0,0 +1,40 @@
+# worker.py - Standalone refresh worker, runs the rating refresh outside the bot process
+import argparse
+import asyncio
+import logging
+import config
+from database import setup_database
+from refresh import run_refresh
+from logging_setup import setup_logging
+
+setup_logging()
+
+logger = logging.getLogger('chess_bot.worker')
+
+async def run_worker(partition, partitions, once):
+	"""Refresh ratings on the configured interval until stopped"""
+	while True:
+		await run_refresh("worker", partition, partitions)
+		if once:
+			return
+		await asyncio.sleep(config.REFRESH_INTERVAL_HOURS * 3600)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Chess.com rating refresh worker")
+	parser.add_argument("--partition", type=int, default=0,
+					 	help="Index of the user partition handled by this worker")
+	parser.add_argument("--partitions", type=int, default=1,
+					 	help="Total number of workers sharing the refresh")
+	parser.add_argument("--once", action="store_true",
+					 	help="Run a single refresh and exit")
+	args = parser.parse_args()
+	if args.partitions < 1:
+		parser.error("--partitions must be at least 1")
+	if not 0 <= args.partition < args.partitions:
+		parser.error(f"--partition must be between 0 and {args.partitions - 1}")
+
+	if config.REFRESH_MODE != "worker":
+		logger.warning("REFRESH_MODE is not 'worker', the bot will also refresh ratings itself")
+
+	setup_database()
+	asyncio.run(run_worker(args.partition, args.partitions, args.once))